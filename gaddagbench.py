@@ -0,0 +1,315 @@
+""" Module containing a benchmark suite for pygaddag
+
+    Times building, saving and loading a GADDAG and the latency of each
+    family of searches, on a deterministic synthetic lexicon or on a
+    real word list, and records the memory taken by each stage and
+    GADDAG.stats.
+    The results are written as JSON so that runs can be compared.
+
+    python gaddagbench.py --size 50000 --output run.json
+    python gaddagbench.py --lexicon sowpods\\sowpods.txt --output sowpods.json
+
+"""
+import os
+import sys
+import gc
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+import tracemalloc
+from statistics import mean, median
+
+from pygaddag import GADDAG, BLANK
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+ALPHABET = 'abcdefghijklmnopqrstuvwxyz'
+
+LETTER_SCORES = {
+    'a': 1, 'b': 3, 'c': 3, 'd': 2, 'e': 1, 'f': 4, 'g': 2, 'h': 4, 'i': 1,
+    'j': 8, 'k': 5, 'l': 1, 'm': 3, 'n': 1, 'o': 1, 'p': 3, 'q': 10, 'r': 1,
+    's': 1, 't': 1, 'u': 1, 'v': 4, 'w': 4, 'x': 8, 'y': 4, 'z': 10}
+
+
+def synthetic_lexicon(size, alphabet=ALPHABET, shortest=2, longest=12, seed=0):
+    """
+    Generate a deterministic lexicon of distinct words. Letters are drawn
+    with falling weights, so that the early letters of the alphabet are
+    common and words share prefixes and suffixes as in a real lexicon.
+
+    Args:
+        size: Number of words
+        alphabet: Letters of the words (Default value = a to z)
+        shortest: Fewest letters in a word (Default value = 2)
+        longest: Most letters in a word (Default value = 12)
+        seed: Seed of the random generator (Default value = 0)
+
+    Returns:
+        A sorted list of words.
+    """
+    if size > sum(len(alphabet) ** n for n in range(shortest, longest + 1)):
+        raise ValueError("{} words cannot be made from {} letters".format(size, len(alphabet)))
+    generator = random.Random(seed)
+    weights = [1.0 / (i + 1) for i in range(len(alphabet))]
+    lengths = list(range(shortest, longest + 1))
+    middle = (shortest + longest) / 2
+    length_weights = [1.0 / (1 + abs(n - middle)) for n in lengths]
+
+    words = set()
+    while len(words) < size:
+        length = generator.choices(lengths, length_weights)[0]
+        words.add(''.join(generator.choices(alphabet, weights, k=length)))
+    return sorted(words)
+
+
+def read_lexicon(filename):
+    """
+    Read a word list, one word per line, as create_from_file does.
+
+    Args:
+        filename: A path to read from.
+
+    Returns:
+        A list of words.
+    """
+    with open(filename, 'r') as f:
+        return [word for word in map(str.rstrip, f) if len(word) > 1]
+
+
+def peak_rss():
+    """Returns the peak resident memory of this process in bytes, or `None` if it is not known."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def timed(fnct, *args):
+    """
+    Call a function once.
+
+    Returns:
+        (seconds taken, result)
+    """
+    start = time.perf_counter()
+    result = fnct(*args)
+    return time.perf_counter() - start, result
+
+
+def traced(fnct, *args):
+    """
+    Call a function once with tracemalloc on. Tracing slows the call
+    down, so it is made apart from the timed one.
+
+    Returns:
+        (peak bytes allocated during the call, result)
+    """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = fnct(*args)
+        return tracemalloc.get_traced_memory()[1], result
+    finally:
+        tracemalloc.stop()
+
+
+def distribution(times):
+    """
+    Summarise a list of latencies in seconds.
+
+    Returns:
+        A dictionary of count, total, mean, min, median, p90, p99 and max.
+    """
+    times = sorted(times)
+    if not times:
+        return {'count': 0}
+
+    def percentile(p):
+        return times[min(len(times) - 1, int(p * len(times)))]
+
+    return {'count': len(times), 'total': sum(times), 'mean': mean(times),
+            'min': times[0], 'median': median(times), 'p90': percentile(0.9),
+            'p99': percentile(0.99), 'max': times[-1]}
+
+
+def make_queries(words, number, seed=0):
+    """
+    Choose the arguments of each family of searches from the lexicon,
+    so that most searches find something.
+
+    Args:
+        words: The lexicon
+        number: Number of searches of each family
+        seed: Seed of the random generator (Default value = 0)
+
+    Returns:
+        A dictionary of search name: list of argument tuples.
+    """
+    generator = random.Random(seed)
+    alphabet = sorted(set(''.join(words)))
+    sample = [generator.choice(words) for _ in range(number)]
+
+    def part(word, n):
+        return word[:n] if len(word) > n else word
+
+    def rack(word):
+        letters = list(word[:5]) + generator.choices(alphabet, k=2) + [BLANK]
+        generator.shuffle(letters)
+        return ''.join(letters)
+
+    def pattern(word):
+        return ''.join(char if i % 3 == 1 else '-' for i, char in enumerate(word))
+
+    queries = {
+        'is_in': [(word,) for word in sample],
+        'contains_many': [(sample,)],
+        'contains': [(word[1:3],) for word in sample],
+        'starts_with': [(part(word, 3),) for word in sample],
+        'ends_with': [(word[-3:],) for word in sample],
+        'starts_with_no': [(part(word, 2), len(word)) for word in sample],
+        'ends_with_no': [(word[-2:], len(word)) for word in sample],
+        'contains_lett': [(word[1:3], rack(word)) for word in sample],
+        'starts_with_lett': [(part(word, 2), rack(word)) for word in sample],
+        'ends_with_lett': [(word[-2:], rack(word).replace(BLANK, '')) for word in sample],
+        'contains_lett_patt': [(word[:2], rack(word), {1: word[3]} if len(word) > 3 else None)
+                               for word in sample],
+        'find_lett_patt': [(rack(word), pattern(word)) for word in sample],
+        'find_regex': [("{}.*{}".format(word[0], word[-1]),) for word in sample],
+        'find_glob': [("{}*{}?".format(word[:2], word[-2]),) for word in sample],
+        'anagrams': [(word[:7],) for word in sample],
+        'sub_anagrams': [(rack(word),) for word in sample],
+        'best_lett': [(word[:2], rack(word), LETTER_SCORES) for word in sample],
+        'best_lett_patt': [(rack(word), pattern(word), LETTER_SCORES) for word in sample],
+    }
+    return queries
+
+
+def bench_queries(gaddag, queries):
+    """
+    Time every search of every family, reading all of its results.
+
+    Returns:
+        A dictionary of search name: latency distribution with the number of results.
+    """
+    results = {}
+    for name, jobs in queries.items():
+        search = getattr(gaddag, name)
+        times = []
+        found = 0
+        for args in jobs:
+            start = time.perf_counter()
+            result = search(*args)
+            found += result if isinstance(result, bool) else len(list(result))
+            times.append(time.perf_counter() - start)
+        results[name] = dict(distribution(times), results=found)
+    return results
+
+
+def run(words, queries=200, seed=0, directory=None, anagrams=True):
+    """
+    Run the whole benchmark on a lexicon.
+
+    Args:
+        words: The lexicon, a list of words
+        queries: Number of searches of each family (Default value = 200)
+        seed: Seed of the random generator for the searches (Default value = 0)
+        directory: Where to write the temporary files (Default value = None for the system default)
+        anagrams: Build the anagram index for the anagram searches (Default value = True)
+
+    Returns:
+        A dictionary of the results.
+    """
+    report = {'python': platform.python_version(), 'platform': platform.platform(),
+              'words': len(words), 'letters': sum(map(len, words))}
+    timings = report['timings'] = {}
+    # Peak bytes allocated by each stage, which ru_maxrss cannot tell
+    # apart as it only ever grows over the life of the process
+    memory = report['memory'] = {}
+
+    def added():
+        gaddag = GADDAG()
+        for word in words:
+            gaddag.add(word)
+        return gaddag
+
+    def created():
+        gaddag = GADDAG()
+        gaddag.create_from_file(wordlist, None, anagrams)
+        return gaddag
+
+    with tempfile.TemporaryDirectory(dir=directory) as folder:
+        wordlist = os.path.join(folder, 'words.txt')
+        with open(wordlist, 'w') as f:
+            f.writelines(word + '\n' for word in words)
+
+        gc.collect()
+        timings['add'], gaddag = timed(added)
+        report['stats_added'] = gaddag.stats()
+        del gaddag
+        memory['add'], _ = traced(added)
+
+        gc.collect()
+        timings['create_from_file'], _ = timed(created)
+        memory['create_from_file'], gaddag = traced(created)
+        report['stats'] = gaddag.stats()
+        timings['len'], report['len'] = timed(len, gaddag)
+
+        saved = os.path.join(folder, 'lexicon.p')
+        timings['save'], _ = timed(gaddag.save, saved)
+        report['saved_bytes'] = os.path.getsize(saved)
+        binary = os.path.join(folder, 'lexicon.gdag')
+        timings['save_binary'], _ = timed(gaddag.save_binary, binary)
+        report['binary_bytes'] = os.path.getsize(binary)
+
+        for name, filename in (('load', saved), ('safeload', saved), ('mapload', binary)):
+            gc.collect()
+            loaded = GADDAG()
+            timings[name], _ = timed(getattr(loaded, name), filename)
+            timings[name + '_len'], _ = timed(len, loaded)
+            del loaded
+            memory[name], _ = traced(getattr(GADDAG(), name), filename)
+
+        searches = make_queries(words, queries, seed)
+        report['queries'] = bench_queries(gaddag, searches)
+        memory['queries'], _ = traced(bench_queries, gaddag, searches)
+    report['peak_rss'] = peak_rss()
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark pygaddag and write the results as JSON")
+    parser.add_argument('--lexicon', help="word list to use, one word per line")
+    parser.add_argument('--size', type=int, default=20000, help="words in the synthetic lexicon")
+    parser.add_argument('--alphabet', default=ALPHABET, help="letters of the synthetic lexicon")
+    parser.add_argument('--shortest', type=int, default=2, help="fewest letters in a synthetic word")
+    parser.add_argument('--longest', type=int, default=12, help="most letters in a synthetic word")
+    parser.add_argument('--queries', type=int, default=200, help="searches of each family")
+    parser.add_argument('--seed', type=int, default=0, help="seed of the lexicon and searches")
+    parser.add_argument('--output', help="JSON file to write, default standard output")
+    args = parser.parse_args(argv)
+
+    if args.lexicon:
+        words = read_lexicon(args.lexicon)
+        source = {'lexicon': args.lexicon}
+    else:
+        words = synthetic_lexicon(args.size, args.alphabet, args.shortest, args.longest, args.seed)
+        source = {'size': args.size, 'alphabet': args.alphabet, 'shortest': args.shortest,
+                  'longest': args.longest, 'seed': args.seed}
+
+    report = dict(source=source, **run(words, args.queries, args.seed))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == '__main__':
+    main()
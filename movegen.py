@@ -0,0 +1,362 @@
+""" Module containing a Scrabble move generator built on the GADDAG
+
+    Class MoveGenerator finds every legal placement of a rack on a board,
+    with its score, using the anchor square algorithm of Gordon (1994):
+    each move is grown from an anchor square along the GADDAG paths,
+    leftwards first and then, after the "+" edge, rightwards.
+    Cross-check sets are cached between turns and only the lines touched
+    by a move are recalculated.
+
+    The board is a list of rows. An empty square is None, '', ' ' or '.',
+    and a blank already on the board is an upper case letter. A letter
+    may be a tile of several characters of the alphabet of the GADDAG.
+
+"""
+from collections import namedtuple
+
+from pygaddag import Rack, BLANK
+
+# Tiles placed are (row, col, letter, is_blank)
+Move = namedtuple('Move', 'row col across word tiles score')
+
+EMPTY = (None, '', ' ', '.')
+
+LETTER_SCORES = {
+    'a': 1, 'b': 3, 'c': 3, 'd': 2, 'e': 1, 'f': 4, 'g': 2, 'h': 4, 'i': 1,
+    'j': 8, 'k': 5, 'l': 1, 'm': 3, 'n': 1, 'o': 1, 'p': 3, 'q': 10, 'r': 1,
+    's': 1, 't': 1, 'u': 1, 'v': 4, 'w': 4, 'x': 8, 'y': 4, 'z': 10}
+
+# T triple word, D double word, t triple letter, d double letter
+STANDARD_PREMIUMS = (
+    "T..d...T...d..T",
+    ".D...t...t...D.",
+    "..D...d.d...D..",
+    "d..D...d...D..d",
+    "....D.....D....",
+    ".t...t...t...t.",
+    "..d...d.d...d..",
+    "T..d...D...d..T",
+    "..d...d.d...d..",
+    ".t...t...t...t.",
+    "....D.....D....",
+    "d..D...d...D..d",
+    "..D...d.d...D..",
+    ".D...t...t...D.",
+    "T..d...T...d..T")
+
+LETTER_MULTIPLIERS = {'d': 2, 't': 3}
+WORD_MULTIPLIERS = {'D': 2, 'T': 3}
+
+
+class MoveGenerator:
+    """Finds and scores all legal moves for a rack on a board."""
+
+    def __init__(self, gaddag, board, letter_scores=None, premiums=None, bingo=50, rack_size=7,
+                 lexicons=None):
+        """
+        Args:
+            gaddag: The GADDAG of the lexicon.
+            board: List of rows of squares.
+            letter_scores: Dictionary of letter: score (Default value = LETTER_SCORES)
+            premiums: List of strings using the STANDARD_PREMIUMS codes
+                      (Default value = STANDARD_PREMIUMS on a 15 x 15 board)
+            bingo: Bonus for playing rack_size tiles in one move
+            rack_size: Number of tiles in a full rack
+            lexicons: Lexicons of the GADDAG whose words may be played,
+                      see GADDAG.lexicon_mask (Default value = None for all)
+        """
+        self.gaddag = gaddag
+        self.alphabet = gaddag.alphabet
+        self.select = gaddag.lexicon_mask(lexicons)
+        self.board = [[None if square in EMPTY else square for square in row] for row in board]
+        self.rows = len(self.board)
+        self.cols = len(self.board[0]) if self.board else 0
+        self.letter_scores = LETTER_SCORES if letter_scores is None else letter_scores
+        if premiums is None and self.rows == self.cols == len(STANDARD_PREMIUMS):
+            premiums = STANDARD_PREMIUMS
+        self.premiums = premiums
+        self.bingo = bingo
+        self.rack_size = rack_size
+
+        # Cross-checks for (across, down), keyed on (line, pos) of each direction
+        self._checks = ({}, {})
+
+    # ------------------------------------------------------------------------------
+    # Public interface
+
+    def generate(self, rack):
+        """
+        Find all legal moves.
+
+        Args:
+            rack: Rack, list or string of tiles, ' ' for a blank
+
+        Returns:
+            A list of Move.
+        """
+        rack = Rack(self.alphabet.encode_letters(rack))
+        moves = []
+        for across in (True, False):
+            lines = self._lines(across)
+            anchors = self._anchors(lines)
+            for line, anchor in sorted(anchors):
+                self._extend(lines, across, line, anchor, anchor, self.gaddag.root,
+                             [], [], rack, anchors, moves)
+        return moves
+
+    def best(self, rack, count=1):
+        """
+        Find the highest scoring moves.
+
+        Args:
+            rack: Rack, list or string of tiles, ' ' for a blank
+            count: Number of moves wanted
+
+        Returns:
+            A list of Move, highest score first.
+        """
+        return sorted(self.generate(rack), key=lambda move: -move.score)[:count]
+
+    def play(self, move):
+        """
+        Put the tiles of a move on the board and drop the cross-checks
+        of the squares whose neighbours have changed.
+
+        Args:
+            move: A Move returned by generate.
+        """
+        across_checks, down_checks = self._checks
+        for row, col, letter, is_blank in move.tiles:
+            self.board[row][col] = letter.upper() if is_blank else letter
+            for other in range(self.rows):
+                across_checks.pop((other, col), None)
+            for other in range(self.cols):
+                down_checks.pop((other, row), None)
+
+    # ------------------------------------------------------------------------------
+    # Board geometry
+
+    def _lines(self, across):
+        """Return the board as rows, or as columns if not across."""
+        if across:
+            return self.board
+        return [list(column) for column in zip(*self.board)]
+
+    def _square(self, across, line, pos):
+        """Return the board (row, col) of a square given as (line, pos)."""
+        return (line, pos) if across else (pos, line)
+
+    def _anchors(self, lines):
+        """
+        Find the empty squares next to a tile, or the centre square of
+        an empty board.
+
+        Returns:
+            A set of (line, pos).
+        """
+        anchors = set()
+        for i, line in enumerate(lines):
+            for j, square in enumerate(line):
+                if square is not None:
+                    continue
+                for di, dj in ((-1, 0), (1, 0), (0, -1), (0, 1)):
+                    if 0 <= i + di < len(lines) and 0 <= j + dj < len(line) \
+                            and lines[i + di][j + dj] is not None:
+                        anchors.add((i, j))
+                        break
+
+        if not anchors and all(square is None for line in lines for square in line) and lines:
+            anchors.add((len(lines) // 2, len(lines[0]) // 2))
+        return anchors
+
+    def _cross_check(self, lines, across, line, pos):
+        """
+        Find the letters that can go on an empty square without making
+        an invalid word at right angles to the move.
+
+        Returns:
+            (set of letters or None for any, score of the tiles
+             in the cross word or None if there is none)
+        """
+        checks = self._checks[0 if across else 1]
+        key = (line, pos)
+        if key not in checks:
+            upper = []
+            i = line - 1
+            while i >= 0 and lines[i][pos] is not None:
+                upper.insert(0, lines[i][pos])
+                i -= 1
+            lower = []
+            i = line + 1
+            while i < len(lines) and lines[i][pos] is not None:
+                lower.append(lines[i][pos])
+                i += 1
+
+            if not upper and not lower:
+                checks[key] = (None, None)
+            else:
+                score = sum(self._value(tile) for tile in upper + lower)
+                upper = [tile.lower() for tile in upper]
+                lower = [tile.lower() for tile in lower]
+                checks[key] = (self._fillers(upper, lower), score)
+        return checks[key]
+
+    def _fillers(self, upper, lower):
+        """Return the set of letters x for which upper + x + lower is a word."""
+        allowed = set()
+        root = self.gaddag.root
+        alphabet = self.alphabet
+        sep = alphabet.sep
+        upper = alphabet.encode(upper)
+        lower = alphabet.encode(lower)
+        if upper:
+            # Path reverse(upper) + "+" + x + lower
+            node = root.follow(upper[::-1])
+            if node is None or sep not in node:
+                return allowed
+            for code, child in node[sep].items():
+                end = child.follow(lower)
+                if end is not None and self._is_word(end):
+                    allowed.add(alphabet.symbol(code))
+        else:
+            # Path reverse(lower) + x + "+"
+            node = root.follow(lower[::-1])
+            if node is None:
+                return allowed
+            for code, child in node.items():
+                if code != sep and sep in child and self._is_word(child[sep]):
+                    allowed.add(alphabet.symbol(code))
+        return allowed
+
+    # ------------------------------------------------------------------------------
+    # Move generation
+
+    def _extend(self, lines, across, line, anchor, pos, node, word, placed, rack, anchors, moves):
+        """
+        Put a letter on square pos, either the tile already there or
+        each tile from the rack that the node and cross-check allow.
+
+        Args:
+            lines: Board as lines in the direction of the move
+            across: Direction of the move
+            line: Index of the line of the move
+            anchor: Position of the anchor square in the line
+            pos: Position of the square to fill
+            node: GADDAG node reached so far
+            word: List of the letters of the move so far
+            placed: List of (pos, letter, is_blank) placed so far
+            rack: Rack of the codes of the tiles left
+            anchors: Set of anchor squares as (line, pos)
+            moves: List of moves found
+        """
+        alphabet = self.alphabet
+        tile = lines[line][pos]
+        if tile is not None:
+            letter = tile.lower()
+            code = alphabet.code(letter)
+            if code in node:
+                self._go_on(lines, across, line, anchor, pos, letter, node[code],
+                            word, placed, rack, anchors, moves)
+            return
+
+        allowed, _ = self._cross_check(lines, across, line, pos)
+        for code, child in node.items():
+            if code == alphabet.sep:
+                continue
+            letter = alphabet.symbol(code)
+            if allowed is not None and letter not in allowed:
+                continue
+            for tile in (code, BLANK):
+                if rack.take(tile, blank=tile == BLANK) is None:
+                    continue
+                placed.append((pos, letter, tile == BLANK))
+                self._go_on(lines, across, line, anchor, pos, letter, child,
+                            word, placed, rack, anchors, moves)
+                placed.pop()
+                rack.put(tile)
+
+    def _go_on(self, lines, across, line, anchor, pos, letter, node, word, placed, rack, anchors, moves):
+        """
+        Add the letter on square pos to the move and carry on to the next
+        square: leftwards up to the anchor, then rightwards after "+".
+        Arguments as _extend, with node reached by the letter.
+        """
+        squares = lines[line]
+        sep = self.alphabet.sep
+        if pos <= anchor:
+            word = [letter] + word
+            left_clear = pos == 0 or squares[pos - 1] is None
+            right_clear = anchor + 1 == len(squares) or squares[anchor + 1] is None
+            if left_clear and right_clear and sep in node and self._is_word(node[sep]):
+                self._record(lines, across, line, pos, word, placed, moves)
+
+            # Squares to the left that are anchors start moves of their own
+            if pos > 0 and (squares[pos - 1] is not None or (line, pos - 1) not in anchors):
+                self._extend(lines, across, line, anchor, pos - 1, node,
+                             word, placed, rack, anchors, moves)
+            if left_clear and anchor + 1 < len(squares) and sep in node:
+                self._extend(lines, across, line, anchor, anchor + 1, node[sep],
+                             word, placed, rack, anchors, moves)
+        else:
+            word = word + [letter]
+            right_clear = pos + 1 == len(squares) or squares[pos + 1] is None
+            if right_clear and self._is_word(node):
+                self._record(lines, across, line, pos - len(word) + 1, word, placed, moves)
+            if pos + 1 < len(squares):
+                self._extend(lines, across, line, anchor, pos + 1, node,
+                             word, placed, rack, anchors, moves)
+
+    def _record(self, lines, across, line, start, word, placed, moves):
+        """
+        Score a complete move and add it to moves.
+        A single tile making words both ways is only kept as an across move.
+        """
+        if len(word) < 2:
+            return
+        if not across and len(placed) == 1 \
+                and self._cross_check(lines, across, line, placed[0][0])[1] is not None:
+            return
+
+        new = {pos: is_blank for pos, _, is_blank in placed}
+        total = 0
+        multiplier = 1
+        cross_total = 0
+        for pos in range(start, start + len(word)):
+            if pos not in new:
+                total += self._value(lines[line][pos])
+                continue
+
+            value = 0 if new[pos] else self.letter_scores.get(word[pos - start], 0)
+            premium = self._premium(across, line, pos)
+            value *= LETTER_MULTIPLIERS.get(premium, 1)
+            word_multiplier = WORD_MULTIPLIERS.get(premium, 1)
+            total += value
+            multiplier *= word_multiplier
+
+            _, cross_score = self._cross_check(lines, across, line, pos)
+            if cross_score is not None:
+                cross_total += (cross_score + value) * word_multiplier
+
+        score = total * multiplier + cross_total
+        if len(placed) == self.rack_size:
+            score += self.bingo
+
+        row, col = self._square(across, line, start)
+        tiles = tuple(self._square(across, line, pos) + (letter, is_blank)
+                      for pos, letter, is_blank in sorted(placed))
+        moves.append(Move(row, col, across, ''.join(word), tiles, score))
+
+    def _is_word(self, node):
+        """Return `True` if node ends a word of the lexicons played."""
+        return node.is_end if self.select is None else bool(node.end & self.select)
+
+    def _premium(self, across, line, pos):
+        """Return the premium code of a square."""
+        if self.premiums is None:
+            return '.'
+        row, col = self._square(across, line, pos)
+        return self.premiums[row][col]
+
+    def _value(self, tile):
+        """Return the score of a tile on the board, 0 for a blank."""
+        return 0 if tile.isupper() else self.letter_scores.get(tile, 0)
@@ -1,52 +1,190 @@
 """ Module containing class to define a GADDAG data structure
 
     Class GADDAG contains all functions for creating and searching
-    the GADDAG
+    the GADDAG. One GADDAG can hold several lexicons: the end of each
+    word carries a bitmask of the lexicons it is in, and every search
+    takes the lexicons to search
 
     Class Node used internally by class GADDAG
 
+    Class Alphabet maps the symbols of a lexicon, including tiles of
+    several characters and the "+" separator, to the integers that
+    label the edges. Searches are encoded and their words decoded by
+    the GADDAG, so callers only ever see symbols
+
+    Class Rack holds the letters for letter limited searches
+
+    Class QueryCache keeps the results of repeated searches
+
+    Class Scorer scores and bounds words for the score ranked searches
+
+    Class Automaton compiles the regular expressions and glob patterns
+    used by find_regex and find_glob
+
+    Class CompactStore holds a finished GADDAG in flat typed arrays,
+    with CompactNode giving the Node interface over it. A CompactStore
+    can be written to a binary file and mapped back into memory
+
+    Class ChunkedStream reads a saved GADDAG in large chunks and
+    reports the progress of the load
+
     from pygaddag import GADDAG, Node
     must be in the main package module for the pickle load to work
 
 """
 import io
+import os
+import sys
+import mmap
 import time
+import zlib
+import asyncio
+import json
+import struct
 import pickle
 import gzip
+import heapq
+import inspect
+import functools
+import itertools
+import multiprocessing
+from array import array
+from bisect import bisect_left
+from operator import attrgetter, itemgetter
+from collections import OrderedDict, namedtuple
 
 # Following line required if openload is used with Qt
 # from PyQt5.QtWidgets import QApplication
 
 WORDLIST_PATH = 'sowpods\\sowpods.txt'
+BLANK = ' '
+
+# Name of the lexicon of words added without one, which has bit 0 of the end masks
+DEFAULT_LEXICON = 'default'
+
+# Binary file format: header, table of sections, then the sections,
+# each starting on an 8 byte boundary. All integers are little endian.
+BINARY_MAGIC = b'GDAG'
+BINARY_VERSION = 2
+BINARY_HEADER = struct.Struct('<4sHH8x')  # magic, version, number of sections
+BINARY_SECTION = struct.Struct('<4sIQQ')  # name, crc32, offset, length
 
 # Following line required if openload is used with Qt
 # APP = QApplication([]).instance()
 
+# What lies below a node: fewest and most letters still needed to finish
+# a word, number of ways to finish one and bitmask of the letters, bit
+# code % 64 for each, so that it fits in 64 bits. Letters 64 codes apart
+# share a bit, which only makes the pruning on it weaker
+NodeInfo = namedtuple('NodeInfo', 'shortest longest words letters')
+# shortest of a node below which there is no word, the largest length the
+# arrays of CompactStore.infos hold
+NO_WORD = NodeInfo(0x7FFF, -1, 0, 0)
+
+# Searches that GADDAG.search_batch can run
+BATCH_SEARCHES = ('contains', 'starts_with', 'ends_with', 'starts_with_no', 'ends_with_no',
+                  'contains_lett', 'starts_with_lett', 'ends_with_lett',
+                  'contains_lett_patt', 'find_lett_patt', 'find_regex', 'find_glob',
+                  'anagrams', 'sub_anagrams')
+
+# The GADDAG searched by the processes of a batch: inherited on fork, or mapped
+_batch_gaddag = None
+
+# Yielded by _walk in place of a word when an async search should pause
+_PAUSE = object()
+
+# Edge put by _walk between the edges of a node and the same edges tried with a blank
+_BLANKS = (None, None)
+
+
+def _cached(fnct):
+    """
+    Decorator for GADDAG searches whose results can be kept in its QueryCache.
+    The key is the search name with the codes of the affix, the count of
+    each letter and of blanks and the mask of the lexicons, so the same
+    search given as a string or a list, or with the letters in another
+    order, is found again, but tiles of several characters are not taken
+    for their characters.
+    """
+    signature = inspect.signature(fnct)
+    parameters = list(signature.parameters)[1:]
+
+    @functools.wraps(fnct)
+    def search(self, *args, **kwargs):
+        cache = self._cache
+        if cache is None:
+            return fnct(self, *args, **kwargs)
+
+        bound = signature.bind(self, *args, **kwargs)
+        bound.apply_defaults()
+        values = bound.arguments
+        alphabet = self._alphabet
+        key = (fnct.__name__,)
+        for name in parameters:
+            if name == 'letters':
+                rack = Rack(alphabet.encode_letters(values[name] or []))
+                key += (tuple(rack.counts), rack.blanks)
+            elif name == 'lexicons':
+                key += (self.lexicon_mask(values[name]),)
+            else:
+                key += (tuple(alphabet.encode(values[name])),)
+        # Words are held as tuples of symbols and handed out as new lists each time
+        result = cache.get(key)
+        if result is None:
+            result = tuple((item[0], tuple(item[1])) if isinstance(item, tuple) else tuple(item)
+                           for item in fnct(self, *args, **kwargs))
+            cache.put(key, result)
+        return ((item[0], list(item[1])) if isinstance(item[0], int) else list(item)
+                for item in result)
+
+    return search
+
+
+def _start_batch(filename):
+    """Map the GADDAG of a batch into a worker process that was not forked."""
+    global _batch_gaddag
+    if filename is not None:
+        _batch_gaddag = GADDAG()
+        _batch_gaddag.mapload(filename, verify=False)
+
+
+def _run_batch_job(job):
+    """Run one (search name, args...) job of a batch on the shared GADDAG."""
+    return _batch_gaddag.search_job(job)
+
 
 class GADDAG:
     """A data structure that allows extremely fast searching of words."""
 
-    def __init__(self, words=None):
+    def __init__(self, words=None, alphabet=None):
+        self._alphabet = Alphabet() if alphabet is None else alphabet
         self._len = 0
         self._changed = False
         self._root = Node()
+        self._cache = None
+        self._anagrams = None
+        self._lexicons = []  # names of the lexicons, bit i of an end mask for the ith
+        self._pause = None  # nodes visited between pauses, while an async search starts
 
         if words is not None:
             self.add(words)
 
     def __len__(self):
+        # The count is kept by add and build, and saved with the GADDAG,
+        # so the words only need counting after loading an older file
         if self._changed:
             self._len = 0
             for _ in self:
                 self._len += 1
+            self._changed = False
 
         return self._len
 
     def __contains__(self, word):
-        return self._has(word.lower())
+        return self._has(self._alphabet.encode(word.lower()))
 
     def __iter__(self):
-        return self._crawl_end(self.root, [])
+        return self._walk(self.root, [])
 
     def __eq__(self, other):
         if type(other) is not type(self):
@@ -62,6 +200,221 @@ class GADDAG:
         """Returns the root node of the GADDAG."""
         return self._root
 
+    @property
+    def alphabet(self):
+        """Returns the Alphabet coding the edge labels."""
+        return self._alphabet
+
+    @property
+    def compacted(self):
+        """Returns `True` if the nodes are held in a CompactStore."""
+        return isinstance(self._root, CompactNode)
+
+    @property
+    def cache(self):
+        """Returns the QueryCache of search results, or `None` if there is none."""
+        return self._cache
+
+    def set_cache(self, entries=1024, size=None):
+        """
+        Keep the results of the most recent searches, so that a repeated
+        search is answered without walking the GADDAG. The cache is
+        emptied whenever words are added or the GADDAG is loaded.
+
+        Args:
+            entries: Most results to keep, `None` for no limit, 0 to stop caching
+                     (Default value = 1024)
+            size: Most bytes of results to keep, `None` for no limit, 0 to stop caching
+
+        Returns:
+            The new QueryCache, or `None` if either limit is 0
+        """
+        self._cache = None if entries == 0 or size == 0 else QueryCache(entries, size)
+        return self._cache
+
+    def _clear_cache(self):
+        """Forget cached search results after the nodes have changed."""
+        if self._cache is not None:
+            self._cache.clear()
+
+    def info(self, node=None):
+        """
+        Returns the NodeInfo of a node (Default value = None for the root).
+        """
+        if node is None:
+            node = self._root
+        return NodeInfo(*self._node_info()(node))
+
+    def stats(self):
+        """
+        Walk the graph once, breadth first, counting each node once
+        however many edges lead to it.
+
+        Returns:
+            A dictionary of words, nodes, edges, end_nodes, shared_nodes
+            (reached by more than one edge), fan_out {number of edges:
+            number of nodes}, depth {edges on the shortest path from the
+            root: number of nodes} and bytes, an estimate of the memory
+            held by the nodes.
+        """
+        key = self._node_key()
+        incoming = {key(self._root): 0}
+        fan_out = {}
+        depth = {}
+        edges = ends = size = 0
+        level = [self._root]
+        while level:
+            depth[len(depth)] = len(level)
+            below = []
+            for node in level:
+                items = node.items()
+                fan_out[len(items)] = fan_out.get(len(items), 0) + 1
+                edges += len(items)
+                if node.is_end:
+                    ends += 1
+                if not self.compacted:
+                    size += node.nbytes()
+                for _, child in items:
+                    k = key(child)
+                    if k not in incoming:
+                        incoming[k] = 0
+                        below.append(child)
+                    incoming[k] += 1
+            level = below
+
+        return {'words': len(self), 'nodes': len(incoming), 'edges': edges, 'end_nodes': ends,
+                'shared_nodes': sum(1 for count in incoming.values() if count > 1),
+                'fan_out': dict(sorted(fan_out.items())), 'depth': depth,
+                'bytes': self._root.store.nbytes() if self.compacted else size}
+
+    @staticmethod
+    def file_stats(filename):
+        """
+        Returns the stats of a GADDAG saved by save or save_binary, with
+        file_bytes, the size of the file, and for a binary file sections
+        {name: length}. A binary file is mapped, not loaded.
+
+        Args:
+            filename: A path to read from.
+        """
+        with open(filename, 'rb') as f:
+            binary = f.read(len(BINARY_MAGIC)) == BINARY_MAGIC
+
+        gaddag = GADDAG()
+        if binary:
+            gaddag.mapload(filename, verify=False)
+        else:
+            gaddag.load(filename)
+        result = gaddag.stats()
+        result['file_bytes'] = os.path.getsize(filename)
+        if binary:
+            store = gaddag.root.store
+            result['sections'] = {name.decode(): length
+                                  for name, _, _, length in store.table(store.mapped, filename)}
+        return result
+
+    @property
+    def lexicons(self):
+        """Returns the names of the lexicons, in the order of their bits in the end masks."""
+        return tuple(self._lexicons)
+
+    def lexicon_mask(self, lexicons=None):
+        """
+        Returns the mask of the end bits of one or more lexicons.
+
+        Args:
+            lexicons: A lexicon name, an iterable of names or a mask
+                      (Default value = None for any lexicon)
+
+        Returns:
+            The mask, or `None` for any lexicon.
+
+        Raises:
+            KeyError: If a lexicon is not in the GADDAG.
+        """
+        if lexicons is None or isinstance(lexicons, int):
+            return lexicons
+        if isinstance(lexicons, str):
+            lexicons = (lexicons,)
+        mask = 0
+        for name in lexicons:
+            if name not in self._lexicons:
+                raise KeyError(name)
+            mask |= 1 << self._lexicons.index(name)
+        return mask
+
+    def _add_mask(self, lexicon):
+        """
+        Returns the end mask given to words added to a lexicon, naming it
+        if it is new. Words added without a lexicon go in the first one,
+        which is DEFAULT_LEXICON unless the lexicons were named before it
+        was kept, so bit 0 is never given to a named lexicon as well.
+        """
+        if lexicon is None:
+            return 1
+        if not self._lexicons:
+            self._lexicons.append(DEFAULT_LEXICON)
+        if lexicon not in self._lexicons:
+            self._lexicons.append(lexicon)
+        return 1 << self._lexicons.index(lexicon)
+
+    def _node_key(self):
+        """Returns the function giving the key of a node in the node information."""
+        return attrgetter('id') if self.compacted else id
+
+    def _node_info(self):
+        """
+        Returns the function giving the (shortest, longest, words, letters)
+        tuple of a node, see NodeInfo.
+
+        A compacted GADDAG works them out once into arrays of its store.
+        Otherwise each Node keeps its own, worked out children first for
+        the nodes whose paths have changed since, which are found from the
+        root as a change drops the information of every node on its path.
+        """
+        if self.compacted:
+            shortest, longest, words, letters = self._root.store.infos(self._alphabet.sep)
+
+            def info(node):
+                i = node.id
+                return shortest[i], longest[i], words[i], letters[i]
+
+            return info
+
+        if self._root._info is None:
+            sep = self._alphabet.sep
+            found = {}  # each distinct tuple kept once
+            stack = [(self._root, None)]
+            while stack:
+                node, edges = stack.pop()
+                if node._info is not None:
+                    continue
+                if edges is None:
+                    edges = node.items()
+                    stack.append((node, edges))
+                    stack.extend((child, None) for _, child in edges if child._info is None)
+                    continue
+
+                shortest, longest, words, letters = (0, 0, 1, 0) if node.is_end else NO_WORD
+                for char, child in edges:
+                    below_shortest, below_longest, below_words, below_letters = child._info
+                    if not below_words:
+                        continue
+                    if char != sep:
+                        below_shortest += 1
+                        below_longest += 1
+                        below_letters |= 1 << (char & 63)
+                    if below_shortest < shortest:
+                        shortest = below_shortest
+                    if below_longest > longest:
+                        longest = below_longest
+                    words += below_words
+                    letters |= below_letters
+                info = (shortest, longest, words, letters)
+                node._info = found.setdefault(info, info)
+
+        return attrgetter('_info')
+
     @staticmethod
     def ask(fnct, *args):
         """
@@ -77,7 +430,7 @@ class GADDAG:
     # ------------------------------------------------------------------------------
     # Creation routines
 
-    def create_from_file(self, filename=WORDLIST_PATH):
+    def create_from_file(self, filename=WORDLIST_PATH, progress=None, anagrams=False, lexicon=None):
         """
         Create a GADDAG from a text file of a lexicon. If no filename is supplied
         then it will default to the WORDLIST_PATH setting. The text file should
@@ -85,18 +438,339 @@ class GADDAG:
         at the very end.
 
         Args:
-            filename: An existing file-like object to read from.
+            filename: A path or an existing file-like object to read from.
+            progress: Optional function called as progress(stage, done, total), see build
+            anagrams: Build the anagram index as well, see build
+            lexicon: Name of the lexicon the words are in, see build
+
+        Returns:
+            The number of words read.
+        """
+        source = filename if isinstance(filename, str) else self._read_words(filename)
+        return self.build(source, progress, anagrams=anagrams, lexicon=lexicon)
+
+    @staticmethod
+    def _read_words(lines):
+        """Returns a generator of the words of a word list, one per line, without blank lines or one letter words."""
+        return (word for word in map(str.rstrip, lines) if len(word) > 1)
+
+    def build(self, source, progress=None, presorted=None, anagrams=False, lexicon=None):
+        """
+        Build the GADDAG from a stream of words, keeping any words already in it.
+
+        The words are first added in sorted order to a minimal forward
+        word graph using Daciuk's incremental algorithm: as soon as a word
+        diverges from the previous one, the finished part of the previous
+        word's path is merged with any identical node already built.
+        The node reached by a prefix p in that graph holds exactly the
+        endings of p, which is what the GADDAG needs after the path
+        reverse(p) + "+". The nodes of the reversed prefixes are then
+        built from the forward graph, see _prefix_graph, without listing
+        the prefixes. The result is fully minimised and no membership
+        check is made for each word. A word already in other lexicons is
+        merged into one word in all of them. The words are sorted by their codes.
+
+        The nodes are still built one by one in Python, so on a full lexicon
+        it is only somewhat faster than adding the words one at a time with
+        add, about 1.0s against 1.2s for 30000 words; most of the time goes
+        into the nodes of the reversed prefixes.
+
+        Args:
+            source: A filename, read as by create_from_file, or an iterable
+                    of words, each a string or a sequence of symbols.
+            progress: Optional function called as progress(stage, done, total)
+                      every 10000 words read (stage "words") and every 10000
+                      nodes of the reversed prefixes (stage "prefixes"),
+                      total None
+            presorted: `True` if source is sorted, `False` to sort it first.
+                       By default a sorted source is streamed without being
+                       held in memory, and the rest of it is sorted from the
+                       first word out of order, as with `True` for an
+                       alphabet of symbols, whose codes are not in string
+                       order (Default value = None)
+            anagrams: Build the index of words by sorted letters used by
+                      anagrams and sub_anagrams. An index already held
+                      is always rebuilt (Default value = False)
+            lexicon: Name of the lexicon the words are in
+                     (Default value = None for DEFAULT_LEXICON)
+
+        Returns:
+            The number of distinct words in the GADDAG.
+        """
+        if isinstance(source, str):
+            with open(source, 'r') as f:
+                return self.build(self._read_words(f), progress, presorted, anagrams, lexicon)
+
+        alphabet = self._alphabet
+        mask = self._add_mask(lexicon)
+        words = ((tuple(alphabet.encode(word.strip() if isinstance(word, str) else word, strict=True)), mask)
+                 for word in source)
+        if presorted is False:
+            words = sorted(words)
+        elif alphabet.symbols is not None:
+            # The codes of symbols are not in string order
+            presorted = None
+        existing = sorted((tuple(codes), self._end_mask(codes))
+                          for codes in map(alphabet.encode, self))
+
+        # Minimal forward graph of the words
+        register = {}
+        index = {} if anagrams or self._anagrams is not None else None
+        forward, count, rest = self._forward_graph(heapq.merge(existing, words), register, index, progress,
+                                                   presorted is not None)
+        if rest is not None:
+            # Not sorted after all: sort the words so far with the rest and start again
+            words = sorted(itertools.chain(self._graph_words(forward), rest))
+            register = {}
+            index = None if index is None else {}
+            forward, count, _ = self._forward_graph(iter(words), register, index, progress, True)
+            del words
+
+        # No node with a "+" below it is a forward node, so none of those is needed again
+        register.clear()
+        self._root = self._prefix_graph(forward, register, alphabet.sep, progress)
+        self._len = count
+        self._changed = False
+        self._anagrams = index
+        self._clear_cache()
+        return count
+
+    def _forward_graph(self, words, register, index, progress, strict):
+        """
+        Add sorted words to a minimal forward word graph, see build.
+
+        Args:
+            words: An iterator of (codes, end mask)
+            register: Dictionary of finished nodes keyed on Node.signature
+            index: Anagram index to fill, or None
+            progress: Optional progress function, see build
+            strict: Raise an error for a word out of order
+
+        Returns:
+            (root, number of words, None), or if a word is out of order
+            (root of the words before it, their number, iterator of the
+            word and the rest of words).
+
+        Raises:
+            ValueError: If strict and a word is out of order.
+        """
+        alphabet = self._alphabet
+        forward = Node()
+        path = [forward]
+        previous = ()
+        count = 0
+        for word, end in words:
+            if not word:
+                continue
+            if word == previous:
+                # The node of previous is still at the end of the path
+                path[-1].end |= end
+                continue
+            if word < previous:
+                if strict:
+                    raise ValueError("Words are not sorted: {} after {}".format(
+                        ''.join(alphabet.decode(word)), ''.join(alphabet.decode(previous))))
+                self._register(path, previous, 0, register)
+                return forward, count, itertools.chain([(word, end)], words)
+
+            node = self._diverge(path, previous, word, register)
+            node.end = end
+            previous = word
+            count += 1
+            if index is not None:
+                signature, entry = self._anagram_entry(word)
+                index.setdefault(signature, []).append(entry)
+            if progress is not None and count % 10000 == 0:
+                progress("words", count, None)
+        self._register(path, previous, 0, register)
+        return forward, count, None
+
+    @staticmethod
+    def _graph_words(forward):
+        """Yield (codes, end mask) of every word of a forward word graph, in sorted order."""
+        stack = [(forward, ())]
+        while stack:
+            node, word = stack.pop()
+            if node.end:
+                yield word, node.end
+            stack.extend((node[char], word + (char,)) for char in sorted(node, reverse=True))
+
+    @staticmethod
+    def _prefix_graph(forward, register, sep, progress=None):
+        """
+        Build the nodes of the reversed prefixes, each leading through "+"
+        to the node of the endings of its prefix in a forward word graph,
+        without listing the prefixes.
+
+        The reversed prefixes are read back through the forward graph,
+        depth first in sorted order, from all the nodes they can end at
+        at once. A reversed prefix whose nodes include the root of the
+        forward graph is a prefix, so its node has the "+" edge. Each node
+        is built once its children are, and merged with any identical
+        node already registered, so only the current path is held.
+
+        Args:
+            forward: Root of the minimal forward word graph
+            register: Dictionary of finished nodes keyed on Node.signature
+            sep: Code of the "+" edge
+            progress: Optional progress function, see build
+
+        Returns:
+            The root of the GADDAG.
+        """
+        # Number the nodes of the forward graph, the root 0, and list the
+        # edges into each as sorted (char, (numbers of the nodes they leave))
+        nodes = [forward]
+        numbers = {id(forward): 0}
+        for node in nodes:
+            for _, child in node.items():
+                if id(child) not in numbers:
+                    numbers[id(child)] = len(nodes)
+                    nodes.append(child)
+        pairs = [[] for _ in nodes]
+        for number, node in enumerate(nodes):
+            for char, child in node.items():
+                pairs[numbers[id(child)]].append((char, number))
+        incoming = [tuple((char, tuple(source for _, source in group))
+                          for char, group in itertools.groupby(sorted(edges), key=itemgetter(0)))
+                    for edges in pairs]
+        del pairs
+        start = 0
+
+        def moves(keys):
+            """Returns the sorted (char, ids of the nodes reached back by char) from the nodes keys."""
+            found = {}
+            for key in keys:
+                for char, sources in incoming[key]:
+                    if char in found:
+                        found[char] += sources
+                    else:
+                        found[char] = list(sources)
+            return iter(sorted(found.items()))
+
+        # Below a reversed prefix read back from one node only, all the
+        # reversed prefixes end at the same node, so the node of one read
+        # back from a single node is fixed by that node and the node it ends
+        # at, and is kept for the other reversed prefixes that get there.
+        # Stack entries: the moves still to take, the edges of the node so
+        # far, the nodes it is read back from, the node they end at if there
+        # is only one, and the key of the node kept
+        kept = {}
+        string = []
+        built = 0
+        size = len(nodes)
+        stack = [(moves(range(size)), [], (), None, None)]
+        while True:
+            edges, children, keys, ends, key = stack[-1]
+            for char, reached in edges:
+                string.append(char)
+                last = ends
+                if len(reached) == 1:
+                    if last is None:
+                        last = nodes[reached[0]].follow(string[::-1])
+                    below = numbers[id(last)] * size + reached[0]
+                    node = kept.get(below)
+                    if node is not None:
+                        node.shared = True
+                        children.append((string.pop(), node))
+                        continue
+                    stack.append((iter(incoming[reached[0]]), [], reached, last, below))
+                else:
+                    stack.append((moves(reached), [], reached, last, None))
+                break
+            else:
+                stack.pop()
+                if string and start in keys:
+                    endings = ends if ends is not None else forward.follow(string[::-1])
+                    endings.shared = True
+                    children.insert(0, (sep, endings))
+                signature = Node.signature_of(False, children)
+                node = register.get(signature)
+                if node is None:
+                    node = register[signature] = Node()
+                    for char, child in children:
+                        node.set_edge(char, child)
+                else:
+                    node.shared = True
+                if key is not None:
+                    kept[key] = node
+                built += 1
+                if progress is not None and built % 10000 == 0:
+                    progress("prefixes", built, None)
+                if not stack:
+                    return node
+                stack[-1][1].append((string.pop(), node))
+
+    @classmethod
+    def _diverge(cls, path, previous, string, register):
+        """
+        Register the part of the path of previous that string does not
+        share, then extend the path with new nodes for the rest of string.
+
+        Args:
+            path: List of nodes followed by previous, starting at the root
+            previous: The last string added
+            string: The next string, sorted after previous
+            register: Dictionary of finished nodes keyed on Node.signature
+
+        Returns:
+            The last node on the path of string.
+        """
+        common = 0
+        limit = min(len(string), len(previous))
+        while common < limit and string[common] == previous[common]:
+            common += 1
+        cls._register(path, previous, common, register)
+
+        node = path[-1]
+        for char in string[common:]:
+            child = Node()
+            node.set_edge(char, child)
+            path.append(child)
+            node = child
+        return node
+
+    @staticmethod
+    def _register(path, string, common, register):
+        """
+        Merge the nodes on the path of string below depth common with
+        identical registered nodes, deepest first, and cut the path back.
+
+        Args:
+            path: List of nodes followed by string, starting at the root
+            string: The last path added
+            common: Length of the part of the path still in use
+            register: Dictionary of finished nodes keyed on Node.signature
+        """
+        for i in range(len(path) - 1, common, -1):
+            node = path[i]
+            existing = register.setdefault(node.signature(), node)
+            if existing is not node:
+                existing.shared = True
+                path[i - 1].set_edge(string[i - 1], existing)
+        del path[common + 1:]
+
+    def compact(self):
+        """
+        Move all nodes into a read-only CompactStore.
+        Searches give the same results, but each node costs a few array
+        entries instead of a Python object with its own dict.
         """
+        if not self.compacted:
+            store = CompactStore(self._root)
+            store.count = None if self._changed else self._len
+            store.lexicons = list(self._lexicons)
+            store.alphabet = self._alphabet_state()
+            self._root = store.root
+            self._clear_cache()
 
-        wordcount = 0
-        with open(filename, 'r') as f:
-            for word in f.readlines():
-                stripped = word.rstrip()
-                if len(stripped) > 1:
-                    self.add(stripped)  # Chop the newline
-                    wordcount += 1
-                    if (wordcount % 100) == 0:
-                        print("{0}\r".format(wordcount), end="")
+    def expand(self):
+        """
+        Rebuild Node objects from a CompactStore so that words can be added.
+        """
+        if self.compacted:
+            self._root = self._root.store.to_nodes()
+            self._clear_cache()
 
     def save(self, filename):
         """
@@ -106,686 +780,1641 @@ class GADDAG:
             filename: A path or an existing file-like object to write to.
         """
         with gzip.open(filename, "wb") as f:
-            f.write(pickle.dumps(self._root, 4))
+            f.write(pickle.dumps((self._root, len(self), self._anagrams, self._lexicons,
+                                  self._alphabet_state()), 4))
 
-    def load(self, filename):
+    def _alphabet_state(self):
+        """Returns the state of the alphabet to be saved, None for code points."""
+        return None if self._alphabet.symbols is None else self._alphabet.state()
+
+    def load(self, filename, progress=None, chunk_size=None):
         """
         Load a GADDAG from file.
+        The file is read in large chunks, and after each one progress is
+        called as progress("load", bytes read, file size, bytes per second).
+        The file size is None if it cannot be found.
 
         Args:
             filename: A path or an existing file-like object to read from.
+            progress: Optional function called after each chunk is read (Default value = None)
+            chunk_size: Bytes read at a time (Default value = None for ChunkedStream.chunk_size)
         """
-        with gzip.open(filename, "rb") as f:
-            self._root = pickle.loads(f.read())
-        self._changed = True
+        if progress is None and chunk_size is None:
+            with gzip.open(filename, "rb") as f:
+                self._set_root(pickle.loads(f.read()))
+            return
+        with ChunkedStream(filename, progress, chunk_size) as stream, gzip.open(stream, "rb") as f:
+            self._set_root(pickle.loads(f.read()))
+
+    def save_binary(self, filename):
+        """
+        Save the GADDAG in the flat binary format that mapload can map.
+
+        Args:
+            filename: A path to write to.
+        """
+        store = self._root.store if self.compacted else CompactStore(self._root)
+        store.count = len(self)
+        store.anagrams = self._anagrams
+        store.lexicons = list(self._lexicons)
+        store.alphabet = self._alphabet_state()
+        store.write(filename)
+
+    def merge_file(self, filename, added=(), removed=(), lexicon=None):
+        """
+        Load a GADDAG saved by save or save_binary, apply a delta of words
+        to it with merge and save it again in the same format. The file
+        is not written if the delta changes nothing. A binary file is
+        written under a temporary name and renamed, so processes mapping
+        it keep the old graph.
+
+        Args:
+            filename: A path to read from and write to.
+            added: A filename or an iterable of words to add
+            removed: A filename or an iterable of words to remove
+            lexicon: Name of the lexicon of the delta, see merge
+
+        Returns:
+            (number of words added, number of words removed)
+        """
+        with open(filename, 'rb') as f:
+            binary = f.read(len(BINARY_MAGIC)) == BINARY_MAGIC
+
+        if binary:
+            self.mapload(filename)
+        else:
+            self.load(filename)
+        counts = self.merge(added, removed, lexicon)
+        if counts != (0, 0):
+            if binary:
+                self.compact()
+                self.save_binary(filename)
+            else:
+                self.save(filename)
+        return counts
+
+    def mapload(self, filename, verify=True):
+        """
+        Map a GADDAG saved by save_binary into memory and search it in place.
+        Nothing is unpickled, and processes mapping the same file share
+        its pages. The GADDAG is compacted and read only.
+
+        Args:
+            filename: A path to read from.
+            verify: Check the checksum of every section (Default value = True)
+        """
+        self._set_root(CompactStore.open(filename, verify).root)
+
+    def _set_root(self, loaded):
+        """
+        Use a loaded root node, with the word count, anagram index,
+        lexicon names and alphabet if they were saved.
+
+        Args:
+            loaded: (root, count, anagram index, lexicon names, alphabet state)
+                    or, from older files, the first 3 or 2 of these or the root alone.
+        """
+        if isinstance(loaded, tuple):
+            self._root, self._len = loaded[:2]
+            self._anagrams = loaded[2] if len(loaded) > 2 else None
+            self._lexicons = list(loaded[3]) if len(loaded) > 3 else []
+            alphabet = loaded[4] if len(loaded) > 4 else None
+        else:
+            self._root = loaded
+            store = getattr(loaded, 'store', None)
+            self._len = getattr(store, 'count', None)
+            self._anagrams = getattr(store, 'anagrams', None)
+            self._lexicons = list(getattr(store, 'lexicons', None) or [])
+            alphabet = getattr(store, 'alphabet', None)
+        self._alphabet = Alphabet() if alphabet is None else Alphabet(*alphabet)
+        if isinstance(self._root, Node) and any(isinstance(char, str) for char in self._root):
+            self._recode(self._root)
+        # Without a saved count the words are counted by the next len(),
+        # and add and remove can go on changing _len until then
+        self._changed = self._len is None
+        if self._changed:
+            self._len = 0
+        self._clear_cache()
+
+    @staticmethod
+    def _recode(root):
+        """
+        Key the edges of a graph saved before alphabets, labelled with
+        characters, by their code points, the codes of the default Alphabet.
+        """
+        seen = {id(root)}
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            for char, child in list(node.items()):
+                node.remove_edge(char)
+                node.set_edge(ord(char), child)
+                if id(child) not in seen:
+                    seen.add(id(child))
+                    stack.append(child)
 
-    def openload(self, filename):
+    def openload(self, filename, progress=None, chunk_size=None):
         """
-        Load a GADDAG from file with event processing in Qt.
-        The commented out import and APP specification need to be restored
+        Load a GADDAG from file with event processing, see load.
+        For Qt the commented out import and APP specification need to be
+        restored and progress should call APP.processEvents().
 
         Args:
             filename: A path or an existing file-like object to read from.
+            progress: Optional function called after each chunk is read (Default value = None)
+            chunk_size: Bytes read at a time (Default value = None for ChunkedStream.chunk_size)
         """
-        with gzip.open(OpenStream(filename, "rb")) as f:
-            self._root = pickle.loads(f.read())
-        self._changed = True
+        with ChunkedStream(filename, progress, chunk_size) as stream, gzip.open(stream, "rb") as f:
+            self._set_root(pickle.loads(f.read()))
 
-    def safeload(self, filename):
+    def safeload(self, filename, progress=None, chunk_size=None):
         """
-        Load a GADDAG from file.
+        Load a GADDAG from file, see load.
         Allows pickle to work without importing classes in main module
 
         Args:
             filename: A path or an existing file-like object to read from.
+            progress: Optional function called after each chunk is read (Default value = None)
+            chunk_size: Bytes read at a time (Default value = None for ChunkedStream.chunk_size)
+        """
+        with ChunkedStream(filename, progress, chunk_size) as stream:
+            self._set_root(self._safe_unpickle(stream))
+
+    async def aload(self, filename, interval=1 << 16):
         """
-        with gzip.open(OpenStream(filename, "rb")) as f:
-            self._root = SafeUnpickler(f).load()
-        self._changed = True
-        print("DEBUG end unpickling")
-        print()
+        Load a GADDAG saved by save or save_binary from an asyncio task,
+        handing control back to the event loop after every interval bytes
+        so that other tasks carry on while a large lexicon loads.
+        A file saved by save_binary is mapped and its checksums checked a
+        step at a time. One saved by save is read and unpickled as by
+        safeload in the default executor, so only the classes of this
+        module are loaded. The unpickler holds the GIL, so the event loop
+        may wait while it runs, for about as long as load takes.
+
+        Args:
+            filename: A path to read from.
+            interval: Bytes checked between pauses in a binary file (Default value = 65536)
+        """
+        with open(filename, 'rb') as f:
+            binary = f.read(len(BINARY_MAGIC)) == BINARY_MAGIC
+
+        if binary:
+            store = CompactStore.open(filename, verify=False)
+            view = memoryview(store.mapped)
+            for name, crc, offset, length in store.table(store.mapped, filename):
+                value = 0
+                for start in range(offset, offset + length, interval):
+                    value = zlib.crc32(view[start:min(start + interval, offset + length)], value)
+                    await asyncio.sleep(0)
+                if value != crc:
+                    raise ValueError("{} is corrupt: bad checksum for {}".format(filename, name.decode()))
+            self._set_root(store.root)
+            return
+
+        self._set_root(await asyncio.get_running_loop().run_in_executor(None, self._safe_unpickle, filename))
+
+    @staticmethod
+    def _safe_unpickle(filename):
+        """Returns what a file saved by save holds, unpickled by SafeUnpickler."""
+        with gzip.open(filename, "rb") as f:
+            return SafeUnpickler(io.BytesIO(f.read())).load()
 
-    def add(self, content):
+    def add(self, content, lexicon=None):
         """
         Add a word (or words) to the GADDAG.
 
         Args:
             content: A single word (str) or iterable of words.
+            lexicon: Name of the lexicon the word is in
+                     (Default value = None for DEFAULT_LEXICON)
         """
         # if isinstance(content, str):
         #    return self._add_word(content)
 
         # for word in content:
         #    self._add_word(word)
-        return self._add_word(content)
+        return self._add_word(content, self._add_mask(lexicon))
 
-    def _add_word(self, word):
+    def _add_word(self, word, mask=1):
         """
         Add a word to the GADDAG.
 
         Args:
             word: A word to be added to the GADDAG.
+            mask: End mask of the lexicons the word is in (Default value = 1)
 
         Returns:
             `True` if the word was added to the GADDAG, `False` if it already existed.
+
+        Raises:
+            ValueError: If a symbol of the word is not in the alphabet.
         """
         # word = word.lower()
 
-        if ''.join(word) in self:
-            return False
+        if self.compacted:
+            raise TypeError("GADDAG is compacted; call expand() before adding words")
+
+        alphabet = self._alphabet
+        symbols = alphabet.split(word)
+        word = alphabet.encode(symbols, strict=True)
+        end = self._end_mask(word)
+        if end:
+            if end & mask == mask:
+                return False
+            # Already in another lexicon: only its end nodes change
+            self._set_word_end(word, end | mask)
+            self._clear_cache()
+            return True
+
+        sep = alphabet.sep
 
         # Create path from word[-1]
         node = self.root.add_path(word[-1::-1])
-        node.add_end("+")
+        node.add_end(sep, mask)
 
         # Create path from word[-2]
         node = self.root.add_path(word[-2::-1])
-        node = node.add_edge("+")
-        node.add_end(word[-1])
+        node = node.add_edge(sep)
+        node.add_end(word[-1], mask)
 
         # Create remaining paths (partially minimised)
         for m in range(len(word) - 3, -1, -1):
             existing_node = node
 
             node = self.root.add_path(word[m::-1])
-            node = node.add_edge("+")
+            node = node.add_edge(sep)
 
             char = word[m + 1]
             if char in node:
                 # Current node already has an edge for this char,
-                # try to point the edge at the existing_node instead
-                if node[char] and node[char].edges != existing_node.edges:
+                # try to point the edge at the existing_node instead.
+                # After a copy on write the old node may lack the new edges
+                if node[char] and not node[char].edges <= (existing_node.edges or set()):
                     raise AttributeError("Nodes do not have to same edges.")
 
                 node.set_edge(char, existing_node)
             else:
                 node.add_edge(char, existing_node)
 
-        # Set changed flag so len is recalculated
-        self._changed = True
+        self._len += 1
+        if self._anagrams is not None:
+            signature, entry = self._anagram_entry(word)
+            self._anagrams.setdefault(signature, []).append(entry)
+        self._clear_cache()
+        return True
+
+    def remove(self, word, lexicons=None):
+        """
+        Remove a word from the GADDAG.
+
+        Args:
+            word: The word to be removed.
+            lexicons: The lexicons to remove it from, see lexicon_mask
+                      (Default value = None for all of them)
+
+        Raises:
+            KeyError: If the word is not in the GADDAG.
+        """
+        if not self._remove_word(word, self.lexicon_mask(lexicons)):
+            raise KeyError(word)
+
+    def discard_many(self, words, lexicons=None):
+        """
+        Remove any of the given words that are in the GADDAG.
+
+        Args:
+            words: An iterable of words.
+            lexicons: The lexicons to remove them from, see lexicon_mask
+                      (Default value = None for all of them)
+
+        Returns:
+            The number of words removed.
+        """
+        mask = self.lexicon_mask(lexicons)
+        return sum(self._remove_word(word, mask) for word in words)
+
+    def _remove_word(self, word, mask=None):
+        """
+        Remove a word from the GADDAG.
+
+        Each of the word's paths is made private with copy on write, its
+        end node is unmarked, and nodes left with no words below them are
+        cut off from the end of the path back. The nodes are not merged
+        again; call minimise after many removals for that.
+
+        Args:
+            word: A word to be removed from the GADDAG.
+            mask: End mask of the lexicons to remove it from
+                  (Default value = None for all of them)
+
+        Returns:
+            `True` if the word was removed, `False` if it was not in the GADDAG.
+        """
+        if self.compacted:
+            raise TypeError("GADDAG is compacted; call expand() before removing words")
+
+        symbols = self._alphabet.split(word)
+        word = self._alphabet.encode(symbols)
+        end = self._end_mask(word)
+        if not end or (mask is not None and not end & mask):
+            return False
+
+        if mask is not None and end & ~mask:
+            # Still in other lexicons: only its end nodes change
+            self._set_word_end(word, end & ~mask)
+            self._clear_cache()
+            return True
+
+        self._set_word_end(word, 0)
+        self._len -= 1
+        if self._anagrams is not None:
+            signature, entry = self._anagram_entry(word)
+            self._anagrams[signature].remove(entry)
+            if not self._anagrams[signature]:
+                del self._anagrams[signature]
+        self._clear_cache()
         return True
 
+    def _set_word_end(self, word, end):
+        """
+        Set the end mask at the end of each of the paths of a word in the
+        GADDAG, made private with copy on write. With 0, nodes left with
+        no words below them are cut off from the end of the path back.
+
+        Args:
+            word: A word in the GADDAG, as a list of codes.
+            end: The new end mask.
+        """
+        for m in range(len(word)):
+            chars = word[m::-1] + [self._alphabet.sep] + word[m + 1:]
+            path = [self._root]
+            for char in chars:
+                # The rest of the path may already be cut off from another path
+                if char not in path[-1]:
+                    break
+                path.append(path[-1].own(char))
+            else:
+                path[-1].end = end
+
+            for i in range(len(path) - 1, 0, -1):
+                if path[i].end or len(path[i]):
+                    break
+                path[i - 1].remove_edge(chars[i - 1])
+
+    def minimise(self):
+        """
+        Merge all structurally identical subgraphs into single nodes.
+
+        Nodes are visited children first and looked up in a table keyed on
+        their end flag and edges, so each distinct subgraph is kept once.
+        Merged nodes are marked as shared and copied on write by later adds.
+
+        Returns:
+            (number of nodes before, number of nodes after)
+        """
+        if self.compacted:
+            raise TypeError("GADDAG is compacted; call expand() before minimising")
+
+        registry = {}
+        canonical = {}
+        before = 0
+        stack = [(self._root, False)]
+        while stack:
+            node, expanded = stack.pop()
+            if id(node) in canonical:
+                continue
+            if not expanded:
+                stack.append((node, True))
+                stack.extend((node[char], False) for char in node)
+                continue
+
+            before += 1
+            for char in node:
+                node.set_edge(char, canonical[id(node[char])])
+            canonical[id(node)] = registry.setdefault(node.signature(), node)
+
+        self._root = canonical[id(self._root)]
+        self._clear_cache()
+
+        reached = set()
+        for node in registry.values():
+            for char in node:
+                child = node[char]
+                if id(child) in reached:
+                    child.shared = True
+                reached.add(id(child))
+
+        return before, len(registry)
+
+    def merge(self, added=(), removed=(), lexicon=None):
+        """
+        Apply a delta of words to the GADDAG. Only the paths of the words
+        in the delta are changed, with copy on write, and the GADDAG is
+        then minimised again, so nothing is rebuilt from the word list.
+        A compacted GADDAG is expanded first.
+
+        minimise walks the whole graph, not only the paths changed, so a
+        merge takes time in proportion to the size of the GADDAG however
+        small the delta is: many small deltas are best merged as one.
+
+        Args:
+            added: A filename or an iterable of words to add
+            removed: A filename or an iterable of words to remove
+            lexicon: Name of the lexicon of the delta (Default value = None
+                     to add to the first lexicon and remove from all of them)
+
+        Returns:
+            (number of words added, number of words removed)
+        """
+        self.expand()
+        mask = self._add_mask(lexicon)
+        removals = self.discard_many(self._delta_words(removed), None if lexicon is None else mask)
+        additions = sum(self._add_word(word, mask) for word in self._delta_words(added))
+        if additions or removals:
+            self.minimise()
+        return additions, removals
+
+    @staticmethod
+    def _delta_words(source):
+        """
+        Returns the words of a delta given as a filename or an iterable,
+        skipping blank lines and single letters as create_from_file does.
+        """
+        if isinstance(source, str):
+            with open(source, 'r') as f:
+                return list(GADDAG._read_words(f))
+        return [word for word in (word.strip() if isinstance(word, str) else word for word in source)
+                if len(''.join(word)) > 1]
+
     # ------------------------------------------------------------------------------
     # General interrogation routines
 
-    def is_in(self, word):
+    def is_in(self, word, lexicons=None):
         """
         Check that a given word is in the GADDAG.
 
         Args:
             word: The word to be checked for.
+            lexicons: Lexicons to search, see lexicon_mask (Default value = None for all)
 
         Returns:
             `True` if the word is in the GADDAG, `False` if not.
         """
-        return self._has(word)
+        return self._has(self._alphabet.encode(word), self.lexicon_mask(lexicons))
+
+    def contains_many(self, words, lexicons=None):
+        """
+        Check a batch of words against the GADDAG.
+
+        The reversed words are visited in sorted order so the path shared
+        with the previous word is walked once and only the rest is followed.
+
+        Args:
+            words: An iterable of words.
+            lexicons: Lexicons to search, see lexicon_mask (Default value = None for all)
+
+        Returns:
+            A list with `True` for each word in the GADDAG, `False` if not,
+            in the order of words.
+        """
+        select = self.lexicon_mask(lexicons)
+        alphabet = self._alphabet
+        # Lowered as in __contains__, a word before it is split into
+        # symbols, so that a tile such as 'CH' is found as 'ch'
+        keys = [tuple(alphabet.encode(word.lower() if isinstance(word, str)
+                                      else [symbol.lower() for symbol in word]))[::-1]
+                for word in words]
+        found = [False] * len(keys)
+
+        path = [self.root]  # path[i] is the node reached by previous[:i]
+        previous = ()
+        for i in sorted(range(len(keys)), key=keys.__getitem__):
+            key = keys[i]
+            common = 0
+            for a, b in zip(previous, key):
+                if a != b:
+                    break
+                common += 1
+            del path[common + 1:]
+            previous = key
+
+            node = path[-1]
+            for char in key[len(path) - 1:]:
+                if char not in node:
+                    break
+                node = node[char]
+                path.append(node)
+            else:
+                end = node[alphabet.sep].end if alphabet.sep in node else 0
+                found[i] = bool(end if select is None else end & select)
+
+        return found
 
-    def contains(self, sub):
+    @_cached
+    def contains(self, sub, lexicons=None):
         """
         Find all words containing a substring.
 
         Args:
             sub: A substring to be searched for.
+            lexicons: Lexicons to search, see lexicon_mask (Default value = None for all)
 
         Returns:
             A generator of all words found.
         """
+        sub = self._alphabet.encode(sub)
         start_node = self.root.follow(sub[::-1])
-
-        try:
-            return self._crawl(start_node, sub)
-        except TypeError:
+        if start_node is None:
             return set()
 
-    def starts_with(self, prefix):
+        return self._walk(start_node, sub, select=self.lexicon_mask(lexicons))
+
+    @_cached
+    def starts_with(self, prefix, lexicons=None):
         """
         Find all words starting with a prefix.
 
         Args:
             prefix: A prefix to be searched for.
+            lexicons: Lexicons to search, see lexicon_mask (Default value = None for all)
 
         Returns:
             A generator of all words found.
         """
-
+        prefix = self._alphabet.encode(prefix)
         try:
-            start_node = self.root.follow(prefix[::-1])["+"]
+            start_node = self.root.follow(prefix[::-1])[self._alphabet.sep]
         except (KeyError, TypeError):
             return set()
 
-        return self._crawl(start_node, prefix, wrapped=True)
+        return self._walk(start_node, prefix, wrapped=True, select=self.lexicon_mask(lexicons))
 
-    def ends_with(self, suffix):
+    @_cached
+    def ends_with(self, suffix, lexicons=None):
         """
         Find all words ending with a suffix.
 
         Args:
             suffix: A suffix to be searched for.
+            lexicons: Lexicons to search, see lexicon_mask (Default value = None for all)
 
         Returns:
             A generator of all words found.
         """
-
+        suffix = self._alphabet.encode(suffix)
         start_node = self.root.follow(suffix[::-1])
 
-        return self._crawl_end(start_node, suffix)
+        return self._walk(start_node, suffix, ends=True, select=self.lexicon_mask(lexicons))
 
-    def _has(self, word):
+    def _has(self, word, select=None):
         """
         Check that a given word is in the GADDAG.
 
         Args:
-            word: The word to be checked for.
+            word: The codes of the word to be checked for.
+            select: End mask of the lexicons to look in (Default value = None for all)
 
         Returns:
             `True` if the word is in the GADDAG, `False` if not.
         """
+        end = self._end_mask(word)
+        return True if (end if select is None else end & select) else False
+
+    def _end_mask(self, word):
+        """
+        Returns the end mask of the lexicons a word, given as codes, is in,
+        0 if it is in none.
+        """
         node = self.root
 
         try:
             for char in word[::-1]:
                 node = node[char]
-            node = node["+"]
+            node = node[self._alphabet.sep]
         except KeyError:
-            return False
+            return 0
 
-        return True if node.is_end else False
+        return node.end
 
-    def _crawl(self, node, partial_word, found_words=None, wrapped=False):
+    def _walk(self, node, partial_word, wrapped=False, ends=False, with_no=False,
+              no=None, letters=None, blank=True, pattern=None, fixed=None, anchor=None,
+              automaton=None, scorer=None, select=None):
         """
-        Recursively search the GADDAG for all words, starting at a given node.
+        Search the GADDAG for all words, starting at a given node.
+
+        All searches run on this method, which hands the searches by
+        substring, prefix or suffix alone to _walk_plain and the others to
+        _walk_general. Both walk the GADDAG depth first with an explicit
+        stack, so each word is yielded once however long it is, and only
+        one of the paths of each word is accepted, so no set of found words
+        is needed. Letters on edges before the "+" edge
+        are added in front of partial_word and letters after it are added
+        behind. The arguments are in Alphabet codes and the words found
+        are decoded to lists of symbols.
 
         Args:
             node: The node to start the search at.
-            partial_word: The characters built up so far from traversing edges.
+            partial_word: The characters matched to reach node.
             wrapped: Has the node which signifies the start of the word
-            been located (Default value = False)
+                been located (Default value = False)
+            ends: Only find words ending with partial_word, by not following
+                "+" edges (Default value = False)
+            with_no: Yield (no letters added as prefix, word) (Default value = False)
+            no: Length of words (Default value = None for any)
+            letters: Rack or list of codes of allowed letters (Default value = None for any)
+            blank: ' ' in letters stands for any letter (Default value = True)
+            pattern: Dictionary of letters and position {pos:letter}
+                    {no of chars to right of partial_word: letter}
+                    These letters are not taken from letters
+            fixed: A text pattern string of fixed length
+                   - for any letter eg "---a--"
+            anchor: Position of partial_word in fixed. Letters are then
+                    matched to fixed as they are added, the "+" edge is
+                    only taken at the start of fixed, and the letters in
+                    fixed are not taken from letters (Default value = None)
+            automaton: (backward, forward) Automaton pair. Letters added in
+                       front of partial_word are read by backward, which must
+                       accept before the "+" edge is taken, and letters behind
+                       by forward, which must accept at the end of the word.
+                       From the root, forward reads every letter.
+                       Either may be None if its side has no letters
+                       (Default value = None)
+            scorer: Scorer giving the score of each letter and a bound on
+                    the score still reachable. Words are then yielded as
+                    (score, word) and branches that cannot score more
+                    than scorer.threshold are dropped (Default value = None)
+            select: End mask of the lexicons to find words in
+                    (Default value = None for all)
 
         Returns:
             A generator of all words found.
         """
+        if no is None and letters is None and pattern is None and fixed is None \
+                and automaton is None and scorer is None:
+            return self._walk_plain(node, partial_word, wrapped, ends, with_no, select)
+        return self._walk_general(node, partial_word, wrapped, ends, with_no, no, letters, blank,
+                                  pattern, fixed, anchor, automaton, scorer, select)
 
-        if found_words is None:
-            found_words = set()
+    def _walk_plain(self, node, partial_word, wrapped, ends, with_no, select):
+        """
+        _walk for the searches by substring, prefix or suffix alone, which
+        need none of the checks on letters, patterns, automata and scores
+        that _walk_general makes on every edge. The arguments are as for _walk.
+        """
+        if node is None:
+            return
 
-        if node.is_end and ''.join(partial_word) not in found_words:
-            found_words.add(''.join(partial_word))
-            yield partial_word
+        before = []
+        after = []
+        sep = self._alphabet.sep
+        decode = self._alphabet.decode
+        partial_word = list(partial_word)
+        size = len(partial_word)
+        pause = self._pause
+        visited = 0
+
+        from_root = size == 0 and not wrapped and not ends
+        repeats = size > 0 and not wrapped and not ends
+        if repeats:
+            first = partial_word[0]
+            borders = self._borders(partial_word)
+
+        # Stack entries: node, its edges still to try, wrapped and the list
+        # (before or after) extended to reach the node
+        stack = []
+        entry = (node, wrapped, None)
+        while True:
+            if entry is not None:
+                node, wrapped, added = entry
+                entry = None
+                if pause is not None:
+                    visited += 1
+                    if visited == pause:
+                        visited = 0
+                        yield _PAUSE
+                if select is not None:
+                    is_end = ((node[sep].end if sep in node else 0) if ends else node.end) & select
+                elif ends:
+                    is_end = sep in node and node[sep].is_end
+                else:
+                    is_end = node.is_end
+                if is_end:
+                    word = decode(before[::-1] + partial_word + after)
+                    yield (len(before), word) if with_no else word
+                stack.append((node, iter(node.items()), wrapped, added))
+
+            if not stack:
+                return
+
+            node, edges, wrapped, added = stack[-1]
+            for char, next_node in edges:
+                if char == sep:
+                    # A word of one letter added by add also has a "+" edge
+                    # at the root, which a search from the root must not take
+                    if not wrapped and not ends and not (from_root and not before):
+                        entry = (next_node, True, None)
+                        break
+                elif wrapped:
+                    after.append(char)
+                    entry = (next_node, True, after)
+                    break
+                elif not (from_root and before) and not (repeats and char == first and
+                                                         self._starts_again(before, partial_word, borders)):
+                    before.append(char)
+                    entry = (next_node, False, before)
+                    break
+            else:
+                stack.pop()
+                if added is not None:
+                    added.pop()
 
-        for char in node:
-            next_node = node[char]
+    def _walk_general(self, node, partial_word, wrapped, ends, with_no, no, letters, blank,
+                      pattern, fixed, anchor, automaton, scorer, select):
+        """
+        _walk for the searches with letters, a length, a pattern, an
+        automaton or a scorer. The arguments are as for _walk.
+        """
+        if node is None:
+            return
 
-            if char == "+":
-                for word in self._crawl(next_node, partial_word, found_words, True):
-                    yield word
-            else:
-                new_partial_word = partial_word[:]
-                if wrapped:
-                    new_partial_word.append(char)
+        before = []
+        after = []
+        sep = self._alphabet.sep
+        decode = self._alphabet.decode
+        partial_word = list(partial_word)
+        size = len(partial_word)
+        rack = None if letters is None else Rack(letters)
+
+        # An async search is paused by yielding _PAUSE every so many nodes
+        pause = self._pause
+        visited = 0
+
+        # Every word is found once. A search from the root puts the "+"
+        # after the first letter. A search for a substring uses its first
+        # occurrence, so any branch that puts another occurrence in front
+        # is dropped; with a pattern or an automaton, whether an earlier
+        # occurrence would also do can only be known once the word is complete
+        from_root = size == 0 and not wrapped and not ends
+        repeats = size > 0 and not wrapped and not ends and not pattern \
+            and anchor is None and automaton is None
+        if repeats:
+            first = partial_word[0]
+            borders = self._borders(partial_word)
+
+        # Branches are pruned by the NodeInfo of the node they lead to when
+        # the length is limited, or all letters come from the rack: it must be
+        # possible to finish a word in the letters (or tiles) left, and
+        # without blanks the letters below must include one on the rack
+        limit = no if fixed is None else len(fixed) if no is None else min(no, len(fixed))
+        tiles = len(rack) if rack is not None and not pattern and anchor is None else None
+        mask = None
+        if tiles is not None and not (blank and BLANK in rack):
+            mask = 0
+            for char in rack.codes():
+                if char != BLANK:
+                    mask |= 1 << (char & 63)
+        prune = limit is not None or tiles is not None
+        if prune or automaton is not None:
+            info = self._node_info()
+
+        # The running scores, one for each entry on the stack. Where the
+        # letter premiums differ, a blank may score more on another square
+        # than the tile it stands for, so the edges of each node are tried
+        # again with the blank in place of a tile still on the rack
+        score = None
+        respread = scorer is not None and rack is not None and blank and len(set(scorer.letter)) > 1
+        if scorer is not None:
+            score = sum(scorer.value(char, None, None) for char in partial_word)
+            scores = []
+            if limit is None and tiles is None and automaton is None:
+                info = self._node_info()
+
+        # The automaton states reached, one for each entry on the stack
+        state = None
+        if automaton is not None:
+            backward, forward = automaton
+            state = forward.start if from_root or wrapped else backward.start
+            states = []
+            rest = forward.lengths(forward.start) if forward is not None else (0, 0)
+
+        # Stack entries: node, its edges still to try, wrapped, the list
+        # (before or after) extended to reach the node and the tile taken
+        # from the rack for it, which are put back when the entry is popped,
+        # and whether the edges are being tried again with a blank
+        stack = []
+        entry = (node, wrapped, None, None, state, score)
+        while True:
+            if entry is not None:
+                node, wrapped, added, taken, state, score = entry
+                entry = None
+                if automaton is not None:
+                    states.append(state)
+                if scorer is not None:
+                    scores.append(score)
+                if pause is not None:
+                    visited += 1
+                    if visited == pause:
+                        visited = 0
+                        yield _PAUSE
+                if select is not None:
+                    is_end = (node[sep].end if sep in node else 0) if ends else node.end
+                    is_end &= select
+                elif ends:
+                    is_end = sep in node and node[sep].is_end
+                else:
+                    is_end = node.is_end
+                if is_end and automaton is not None:
+                    is_end = (forward if wrapped else backward).accepts(state)
+                if is_end and (no is None or size + len(before) + len(after) == no):
+                    word = before[::-1] + partial_word + after
+                    if (fixed is None or self.check_pattern(word, fixed)) \
+                            and not (pattern and size and
+                                     self._found_before(word, len(before), partial_word, letters, blank, pattern)) \
+                            and not (automaton is not None and backward is not None and forward is not None and
+                                     self._matched_before(word, len(before), partial_word, backward, forward)):
+                        if scorer is not None:
+                            yield scorer.total(score), decode(word)
+                        else:
+                            yield (len(before), decode(word)) if with_no else decode(word)
+                if respread and rack.blanks:
+                    edges = itertools.chain(node.items(), (_BLANKS,), node.items())
                 else:
-                    new_partial_word.insert(0, char)
-                for word in self._crawl(next_node, new_partial_word, found_words, wrapped):
-                    yield word
+                    edges = iter(node.items())
+                stack.append((node, edges, wrapped, added, taken, False))
+
+            if not stack:
+                return
+
+            node, edges, wrapped, added, taken, blanks = stack[-1]
+            length = size + len(before) + len(after)
+            for char, next_node in edges:
+                if next_node is None:
+                    blanks = True
+                    stack[-1] = (node, edges, wrapped, added, taken, blanks)
+                    continue
+                if prune:
+                    shortest, longest, _, below = info(next_node)
+                    step = 0 if char == sep else 1
+                    if limit is not None and not shortest <= limit - length - step <= longest:
+                        continue
+                    if tiles is not None and shortest > tiles - step:
+                        continue
+                    if mask is not None and shortest and not below & mask:
+                        continue
+
+                if anchor is not None:
+                    if char == sep:
+                        if len(before) != anchor:
+                            continue
+                    else:
+                        pos = anchor + size + len(after) if wrapped else anchor - len(before) - 1
+                        if not 0 <= pos < len(fixed) or fixed[pos] not in ("-", char):
+                            continue
+
+                if automaton is not None:
+                    state = states[-1]
+                    if char == sep:
+                        if wrapped or ends:
+                            continue
+                        if not from_root:
+                            if not backward.accepts(state):
+                                continue
+                            state = forward.start
+                        lowest, highest = forward.lengths(state)
+                    elif wrapped or from_root:
+                        state = forward.step(state, char)
+                        if state is None:
+                            continue
+                        lowest, highest = forward.lengths(state)
+                    else:
+                        state = backward.step(state, char)
+                        if state is None:
+                            continue
+                        lowest, highest = backward.lengths(state)
+                        lowest += rest[0]
+                        highest += rest[1]
+                    shortest, longest = info(next_node)[:2]
+                    if lowest > longest or highest < shortest:
+                        continue
+
+                if char == sep:
+                    # A word of one letter added by add also has a "+" edge
+                    # at the root, which a search from the root must not take
+                    if not wrapped and not ends and not blanks and not (from_root and not before):
+                        entry = (next_node, True, None, None, state, None if scorer is None else scores[-1])
+                        break
+                    continue
+
+                if (no is not None and length >= no) or (fixed is not None and length >= len(fixed)):
+                    continue
+                if from_root and before and not wrapped:
+                    continue
+                if repeats and char == first and not wrapped \
+                        and self._starts_again(before, partial_word, borders):
+                    continue
+
+                if rack is None or (wrapped and pattern and len(after) in pattern) \
+                        or (anchor is not None and fixed[pos] != "-"):
+                    if blanks or (wrapped and pattern and pattern.get(len(after), char) != char):
+                        continue
+                    tile = None
+                elif blanks:
+                    # Only letters for which a tile was taken the first time
+                    if not rack.blanks or char not in rack:
+                        continue
+                    rack.blanks -= 1
+                    tile = BLANK
+                else:
+                    tile = rack.take(char, blank)
+                    if tile is None:
+                        continue
+                    if tiles is not None:
+                        tiles -= 1
+
+                if scorer is not None:
+                    # Positions filled once char is added, for the premiums
+                    if fixed is None:
+                        low = high = square = None
+                    elif anchor is not None:
+                        low = anchor - len(before) - (0 if wrapped else 1)
+                        high = anchor + size + len(after) + (1 if wrapped else 0)
+                        square = high - 1 if wrapped else low
+                    else:
+                        low, high = 0, length + 1
+                        square = length
+                    score = scores[-1] + scorer.value(char, tile, square)
+                    left = info(next_node)[1]
+                    if scorer.threshold is not None \
+                            and scorer.bound(score, rack, left, low, high) <= scorer.threshold:
+                        if tile is not None:
+                            rack.put(tile)
+                            if tiles is not None:
+                                tiles += 1
+                        continue
+
+                extended = after if wrapped else before
+                extended.append(char)
+                entry = (next_node, wrapped, extended, tile, state, score)
+                break
+            else:
+                stack.pop()
+                if automaton is not None:
+                    states.pop()
+                if scorer is not None:
+                    scores.pop()
+                if added is not None:
+                    added.pop()
+                if taken is not None:
+                    rack.put(taken)
+                    if tiles is not None:
+                        tiles += 1
 
-    def _crawl_end(self, node, partial_word):
+    @staticmethod
+    def _borders(sub):
+        """
+        Returns a list whose item k tells whether sub still fits over
+        itself moved k letters to the right, for _starts_again.
         """
-        Recursively search the GADDAG for all words, starting at a given node.
+        return [sub[k:] == sub[:len(sub) - k] for k in range(len(sub) + 1)]
 
-        This method does not follow "+" edges, which has the result that only
-        words completed by prepended the followed edges are found, I.E., those
-        which end with 'partial_word'.
+    @staticmethod
+    def _starts_again(before, sub, borders):
+        """
+        Check whether adding sub[0] in front would give another occurrence
+        of sub at the start of the word, before the one being searched from.
 
         Args:
-            node: The node to start the search at.
-            partial_word: The characters built up so far from traversing edges.
+            before: The letters already added in front of sub, last first.
+            sub: The substring searched for.
+            borders: _borders(sub)
+        """
+        count = len(before) + 1
+        if count < len(sub) and not borders[count]:
+            return False
+        for i in range(1, min(count, len(sub))):
+            if before[-i] != sub[i]:
+                return False
+        return True
 
-        Returns:
-            A generator of all words found.
+    @classmethod
+    def _found_before(cls, word, pos, sub, letters, blank, pattern):
         """
-        try:
-            if node["+"].is_end:
-                yield partial_word
-        except KeyError:
-            pass
-        except TypeError:
-            return
+        Check whether word would also be found from an occurrence of sub
+        before position pos, under the same letters and pattern.
 
-        for char in node:
-            if char != "+":
-                next_node = node[char]
-                new_partial_word = partial_word[:]
-                new_partial_word.insert(0, char)
-                for word in self._crawl_end(next_node, new_partial_word):
-                    yield word
+        Args:
+            word: The word found.
+            pos: Position of the occurrence of sub it was found from.
+            sub: The substring searched for.
+            letters: Rack or list of allowed letters, None for any.
+            blank: ' ' in letters stands for any letter
+            pattern: Dictionary of letters and position after sub
+        """
+        size = len(sub)
+        for i in range(pos):
+            if word[i:i + size] != sub:
+                continue
+            right = word[i + size:]
+            if any(j < len(right) and right[j] != char for j, char in pattern.items()):
+                continue
+            free = word[:i] + [char for j, char in enumerate(right) if j not in pattern]
+            if letters is None or Rack(letters).fits(free, blank):
+                return True
+        return False
+
+    @staticmethod
+    def _matched_before(word, pos, sub, backward, forward):
+        """
+        Check whether word would also be found from an occurrence of sub
+        before position pos, with the letters before and after it matched
+        by the same automata.
+
+        Args:
+            word: The word found.
+            pos: Position of the occurrence of sub it was found from.
+            sub: The letters the search started from.
+            backward: Automaton for the letters before sub, read last first.
+            forward: Automaton for the letters after sub.
+        """
+        size = len(sub)
+        for i in range(pos):
+            if word[i:i + size] == sub and backward.matches(word[i - 1::-1] if i else []) \
+                    and forward.matches(word[i + size:]):
+                return True
+        return False
 
     # ------------------------------------------------------------------------------
     # Length limited interrogation
 
-    def starts_with_no(self, prefix, no):
+    def starts_with_no(self, prefix, no, lexicons=None):
         """
-        Find all words starting with a prefix up to given length.
+        Find all words starting with a prefix of given length.
 
         Args:
             prefix: A prefix to be searched for.
-            no: Maximum length
+            no: Length of words
+            lexicons: Lexicons to search, see lexicon_mask (Default value = None for all)
 
         Returns:
             A generator of all words found.
         """
-
+        prefix = self._alphabet.encode(prefix)
         try:
-            start_node = self.root.follow(prefix[::-1])["+"]
+            start_node = self.root.follow(prefix[::-1])[self._alphabet.sep]
         except (KeyError, TypeError):
             return set()
 
-        return self._crawl_no(start_node, prefix, no, wrapped=True)
+        return self._walk(start_node, prefix, wrapped=True, no=no, select=self.lexicon_mask(lexicons))
 
-    def ends_with_no(self, suffix, no):
+    def ends_with_no(self, suffix, no, lexicons=None):
         """
-        Find all words ending with a suffix up to given length.
+        Find all words ending with a suffix of given length.
 
         Args:
             suffix: A suffix to be searched for.
-            no: Maximum length
+            no: Length of words
+            lexicons: Lexicons to search, see lexicon_mask (Default value = None for all)
 
         Returns:
             A generator of all words found.
         """
-
+        suffix = self._alphabet.encode(suffix)
         start_node = self.root.follow(suffix[::-1])
 
-        return self._crawl_end_no(start_node, suffix, no)
+        return self._walk(start_node, suffix, ends=True, no=no, select=self.lexicon_mask(lexicons))
 
-    def _crawl_no(self, *args, found_words=None, wrapped=False):
+    # ------------------------------------------------------------------------------
+    # Letter limited interrogation
+
+    @_cached
+    def contains_lett(self, sub, letters, lexicons=None):
         """
-        Recursively search the GADDAG for all words up to a given length
-        starting at a given node.
+        Find all words containing a substring using only given letters.
 
         Args:
-            args must contain:
-                node: The node to start the search at.
-                partial_word: The characters built up so far from traversing edges.
-                no: Maximum length
-            keyword parameters:
-                found_words: List of words found so far
-                wrapped: Has the node which signifies the start of the
-                word been located (Default value = False)
+            sub: A substring to be searched for.
+            letters: Rack or list of allowed letters, ' ' for a blank
+            lexicons: Lexicons to search, see lexicon_mask (Default value = None for all)
 
         Returns:
-            A generator of all words found.
+            A generator of all words found as (no letters added before sub, word).
         """
-        node, partial_word, no = args
-
-        if found_words is None:
-            found_words = set()
+        sub = self._alphabet.encode(sub)
+        start_node = self.root.follow(sub[::-1])
+        if start_node is None:
+            return set()
 
-        if node.is_end and ''.join(partial_word) not in found_words:
-            found_words.add(''.join(partial_word))
-            yield partial_word
+        return self._walk(start_node, sub, with_no=True, letters=self._alphabet.encode_letters(letters or []),
+                          select=self.lexicon_mask(lexicons))
 
-        for char in node:
-            next_node = node[char]
+    @_cached
+    def starts_with_lett(self, prefix, letters, lexicons=None):
+        """
+        Find all words starting with a prefix using only given letters.
 
-            if char == "+":
-                for word in self._crawl_no(next_node, partial_word, no,
-                                           found_words=found_words, wrapped=True):
-                    if len(word) == no:
-                        yield word
-            else:
-                if len(partial_word) < no:
-                    new_partial_word = partial_word[:]
-                    if wrapped:
-                        new_partial_word.append(char)
-                    else:
-                        new_partial_word.insert(0, char)
-                    for word in self._crawl_no(next_node, new_partial_word,
-                                               no, found_words=found_words, wrapped=wrapped):
-                        if len(word) == no:
-                            yield word
+        Args:
+            prefix: A prefix to be searched for.
+            letters: Rack or list of allowed letters, ' ' for a blank
+            lexicons: Lexicons to search, see lexicon_mask (Default value = None for all)
 
-    def _crawl_end_no(self, node, partial_word, no):
+        Returns:
+            A generator of all words found as (0, word).
         """
-        Recursively search the GADDAG for all words up to a given length
-        starting at a given node.
+        prefix = self._alphabet.encode(prefix)
+        try:
+            start_node = self.root.follow(prefix[::-1])[self._alphabet.sep]
+        except (KeyError, TypeError):
+            return set()
 
-        This method does not follow "+" edges, which has the result that only
-        words completed by prepended the followed edges are found, I.E., those
-        which end with 'partial_word'.
+        return self._walk(start_node, prefix, wrapped=True, with_no=True,
+                          letters=self._alphabet.encode_letters(letters or []), select=self.lexicon_mask(lexicons))
+
+    @_cached
+    def ends_with_lett(self, suffix, letters, lexicons=None):
+        """
+        Find all words ending with a suffix using only given letters.
 
         Args:
-            node: The node to start the search at.
-            partial_word: The characters built up so far from traversing edges.
-            no: Maximum length
+            suffix: A suffix to be searched for.
+            letters: Rack or list of allowed letters
+            lexicons: Lexicons to search, see lexicon_mask (Default value = None for all)
 
         Returns:
             A generator of all words found.
         """
-        try:
-            if node["+"].is_end:
-                yield partial_word
-        except KeyError:
-            pass
-        except TypeError:
-            return
+        suffix = self._alphabet.encode(suffix)
+        start_node = self.root.follow(suffix[::-1])
 
-        for char in node:
-            if char != "+" and len(partial_word) < no:
-                next_node = node[char]
-                new_partial_word = partial_word[:]
-                new_partial_word.insert(0, char)
-                for word in self._crawl_end_no(next_node, new_partial_word, no):
-                    if len(word) == no:
-                        yield word
+        return self._walk(start_node, suffix, ends=True, letters=self._alphabet.encode_letters(letters or []),
+                          blank=False, select=self.lexicon_mask(lexicons))
 
-    # ------------------------------------------------------------------------------
-    # Letter limited interrogation
-
-    def contains_lett(self, sub, letters):
+    def contains_lett_patt(self, sub, letters=None, pattern=None, lexicons=None):
         """
-        Find all words containing a substring using only given letters.
+        Find all words containing a substring and subsequent pattern of letters.
 
         Args:
             sub: A substring to be searched for.
-            letters: list of allowed letters
+            letters: Rack or list of allowed letters, ' ' for a blank
+                     (Default value = None for any letters)
+            pattern: Dictionary of letters and position {pos:letter}
+                    {no of chars to right of sub: letter}
+                    0 means immediately next to right of sub
+            lexicons: Lexicons to search, see lexicon_mask (Default value = None for all)
 
         Returns:
-            A generator of all words found as (start pos of sub, word.
+            A generator of all words found as (no letters added before sub, word).
         """
-
+        sub = self._alphabet.encode(sub)
         start_node = self.root.follow(sub[::-1])
         if start_node is None:
             return set()
 
-        try:
-            return self._crawl_lett(start_node, sub, letters)
-        except TypeError:
-            return set()
+        alphabet = self._alphabet
+        letters = alphabet.encode_letters(letters) if letters else None
+        pattern = {pos: alphabet.code(char) for pos, char in pattern.items()} if pattern else pattern
+        return self._walk(start_node, sub, with_no=True, letters=letters, pattern=pattern,
+                          select=self.lexicon_mask(lexicons))
 
-    def starts_with_lett(self, prefix, letters):
+    def find_lett_patt(self, letters=None, pattern=None, lexicons=None):
         """
-        Find all words starting with a prefix using only given letters.
+        Find all words containing a pattern of letters.
+        The search starts from the letters of the pattern rather than
+        from the root, so only words with those letters in place are visited.
 
         Args:
-            prefix: A prefix to be searched for.
-            letters: list of allowed letters
+            letters: Rack or list of allowed letters for the - positions
+                     (Default value = None for any letters)
+            pattern: A text pattern string of fixed length
+                     - for any letter eg "---a--"
+            lexicons: Lexicons to search, see lexicon_mask (Default value = None for all)
 
         Returns:
             A generator of all words found.
         """
+        alphabet = self._alphabet
+        if letters is not None:
+            letters = alphabet.encode_letters(letters)
+        return self._walk_pattern(letters, alphabet.encode_pattern(pattern), False,
+                                  select=self.lexicon_mask(lexicons))
 
-        try:
-            start_node = self.root.follow(prefix[::-1])["+"]
-        except (KeyError, TypeError):
-            return set()
-
-        return self._crawl_lett(start_node, prefix, letters, wrapped=True)
-
-    def ends_with_lett(self, suffix, letters):
+    def _walk_pattern(self, letters, pattern, blank, scorer=None, select=None):
         """
-        Find all words ending with a suffix using only given letters.
+        Search for words fitting a pattern, starting from its fixed letters.
 
         Args:
-            suffix: A suffix to be searched for.
-            letters: list of allowed letters
+            letters: Codes of the allowed letters for the - positions, None for any
+            pattern: Codes of a pattern of fixed length, - for any letter
+            blank: ' ' in letters stands for any letter
+            scorer: Scorer of the words, see _walk (Default value = None)
+            select: End mask of the lexicons, see _walk (Default value = None)
 
         Returns:
             A generator of all words found.
         """
+        # Enter the GADDAG at the run of fixed letters with the fewest ways
+        # through it, and match the rest of the pattern going out from there
+        info = self._node_info()
+        best = None
+        i = 0
+        while i < len(pattern):
+            if pattern[i] == "-":
+                i += 1
+                continue
+            j = i
+            while j < len(pattern) and pattern[j] != "-":
+                j += 1
+            node = self.root.follow(pattern[i:j][::-1])
+            if node is None:
+                return set()
+            words = info(node)[2]
+            if best is None or words < best[0]:
+                best = (words, i, j, node)
+            i = j
+
+        if best is None:
+            return self._walk(self.root, [], letters=letters, blank=blank, fixed=pattern, scorer=scorer,
+                              select=select)
+
+        _, i, j, node = best
+        return self._walk(node, pattern[i:j], letters=letters, blank=blank, fixed=pattern, anchor=i,
+                          scorer=scorer, select=select)
 
-        start_node = self.root.follow(suffix[::-1])
-
-        return self._crawl_end_lett(start_node, suffix, letters)
+    # ------------------------------------------------------------------------------
+    # Score ranked interrogation
 
-    def _crawl_lett(self, *args, no=0, found_words=None, wrapped=False):
+    def best_lett(self, sub, letters, scores, count=10, lexicons=None):
         """
-        Recursively search the GADDAG for all words using only the given letters
-        starting at a given node.
+        Find the highest scoring words containing a substring using only given letters.
+        Branches that cannot beat the lowest score kept so far are dropped.
 
         Args:
-            args must contain:
-                node: The node to start the search at.
-                partial_word: The characters built up so far from traversing edges.
-                letters: list of allowed letters
-            keyword parameters:
-                no: Number of letters added as prefix (Default value = 0)
-                found_words: List of words found so far (Default value = None)
-                wrapped: Has the node which signifies the start of the word
-                been located (Default value = False)
+            sub: A substring to be searched for, scored at face value.
+            letters: Rack or list of allowed letters, ' ' for a blank scoring 0
+            scores: Dictionary of letter: score
+            count: Number of words wanted
+            lexicons: Lexicons to search, see lexicon_mask (Default value = None for all)
 
         Returns:
-            A generator of all (no letters added as prefix, word) found.
+            A list of (score, word), highest score first.
         """
+        alphabet = self._alphabet
+        sub = alphabet.encode(sub)
+        start_node = self.root.follow(sub[::-1])
+        if start_node is None:
+            return []
 
-        node, partial_word, letters = args
+        scorer = Scorer(self._encode_scores(scores))
+        return scorer.best(self._walk(start_node, sub, letters=alphabet.encode_letters(letters or []),
+                                      scorer=scorer, select=self.lexicon_mask(lexicons)), count)
 
-        if found_words is None:
-            found_words = set()
+    def best_lett_patt(self, letters, pattern, scores, count=10, premiums=None, lexicons=None):
+        """
+        Find the highest scoring words fitting a pattern, as a move into
+        a line of squares would be scored: letters of the pattern at face
+        value, and the premiums of the - positions applying to the
+        letters put there and to the whole word.
+        Branches that cannot beat the lowest score kept so far are dropped.
 
-        if node.is_end and ''.join(partial_word) not in found_words:
-            found_words.add(''.join(partial_word))
-            yield no, partial_word
+        Args:
+            letters: Rack or list of allowed letters for the - positions,
+                     ' ' for a blank scoring 0 (Default value = None for any letters)
+            pattern: A text pattern string of fixed length
+                     - for any letter eg "---a--"
+            scores: Dictionary of letter: score
+            count: Number of words wanted
+            premiums: String of the same length with d and t for double and
+                      triple letter, D and T for double and triple word and
+                      any other character for none (Default value = None)
+            lexicons: Lexicons to search, see lexicon_mask (Default value = None for all)
 
-        for char in node:
-            next_node = node[char]
+        Returns:
+            A list of (score, word), highest score first.
+        """
+        alphabet = self._alphabet
+        if letters is not None:
+            letters = alphabet.encode_letters(letters)
+        pattern = alphabet.encode_pattern(pattern)
+        scorer = Scorer(self._encode_scores(scores), pattern, premiums)
+        return scorer.best(self._walk_pattern(letters, pattern, True, scorer, self.lexicon_mask(lexicons)),
+                           count)
 
-            if char == "+":
-                for word in self._crawl_lett(next_node, partial_word,
-                                             letters, no=no, found_words=found_words, wrapped=True):
-                    yield word
+    def _encode_scores(self, scores):
+        """Returns a dictionary of letter: score keyed by the codes of the letters."""
+        code = self._alphabet.code
+        return {code(char): score for char, score in scores.items()}
 
-            elif letters and (char in letters or ' ' in letters):
-                if wrapped:
-                    new_partial_word = partial_word[:]
-                    new_partial_word.append(char)
-                    for word in self._crawl_lett(next_node, new_partial_word,
-                                                 self.get_newlist(char, letters, letters), no=no,
-                                                 found_words=found_words, wrapped=wrapped):
-                        yield word
-                else:
-                    new_partial_word = partial_word[:]
-                    new_partial_word.insert(0, char)
-                    for word in self._crawl_lett(next_node, new_partial_word,
-                                                 self.get_newlist(char, letters, letters), no=no + 1,
-                                                 found_words=found_words, wrapped=wrapped):
-                        yield word
+    # ------------------------------------------------------------------------------
+    # Anagram interrogation
+
+    def index_anagrams(self):
+        """
+        Build the index of words by their sorted letters if it is not held.
+        It is kept up to date by add and saved with the GADDAG.
 
-    def _crawl_end_lett(self, node, partial_word, letters):
+        Returns:
+            The index as a dictionary of sorted letters: list of words,
+            see _anagram_entry.
         """
-        Recursively search the GADDAG for all words using only the given letters
-        starting at a given node.
+        if self._anagrams is None:
+            index = {}
+            for word in self:
+                signature, entry = self._anagram_entry(self._alphabet.encode(word))
+                index.setdefault(signature, []).append(entry)
+            self._anagrams = index
+        return self._anagrams
 
-        This method does not follow "+" edges, which has the result that only
-        words completed by prepended the followed edges are found, I.E., those
-        which end with 'partial_word'.
+    @staticmethod
+    def _anagram_entry(codes):
+        """
+        Returns (signature, entry) of a word in the anagram index: the
+        characters of its sorted codes and of its codes. With the default
+        alphabet these are its sorted letters and the word itself, and
+        with tiles of several characters no two words are confused, as
+        joining their symbols would.
 
         Args:
-            node: The node to start the search at.
-            partial_word: The characters built up so far from traversing edges.
-            letters: list of allowed letters
+            codes: The codes of the word
+        """
+        return ''.join(map(chr, sorted(codes))), ''.join(map(chr, codes))
+
+    def anagrams(self, letters, lexicons=None):
+        """
+        Find all words using every one of the given letters.
+
+        Args:
+            letters: Rack or list of letters, ' ' for a blank
+            lexicons: Lexicons to search, see lexicon_mask (Default value = None for all)
 
         Returns:
             A generator of all words found.
         """
-        try:
-            if node["+"].is_end:
-                yield partial_word
-        except KeyError:
-            pass
-        except TypeError:
-            return
+        return self._find_anagrams(letters, True, 0, self.lexicon_mask(lexicons))
 
-        for char in node:
-            if char != "+" and letters and char in letters:
-                next_node = node[char]
-                new_partial_word = partial_word[:]
-                new_partial_word.insert(0, char)
-                for word in self._crawl_end_lett(next_node, new_partial_word,
-                                                 self.get_newlist(char, letters, True)):
-                    yield word
+    def sub_anagrams(self, letters, shortest=2, lexicons=None):
+        """
+        Find all words using some of the given letters.
+
+        Args:
+            letters: Rack or list of letters, ' ' for a blank
+            shortest: Fewest letters in a word (Default value = 2)
+            lexicons: Lexicons to search, see lexicon_mask (Default value = None for all)
 
-    def contains_lett_patt(self, sub, letters=None, pattern=None):
+        Returns:
+            A generator of all words found.
         """
-        Find all words containing a substring and subsequent pattern of letters.
+        return self._find_anagrams(letters, False, shortest, self.lexicon_mask(lexicons))
+
+    def _find_anagrams(self, letters, whole, shortest, select=None):
+        """
+        Look up the sorted letters of each choice of letters from the rack
+        in the anagram index, each blank being any letter of the GADDAG.
+        The index holds the words of all the lexicons.
 
         Args:
-            sub: A substring to be searched for.
-            letters: list of allowed letters,
-            pattern: Dictionary of letters and position {pos:letter}
-                    {no of chars to right of sub: letter}
-                    0 means immediately next to right of sub
+            letters: Rack or list of letters, ' ' for a blank
+            whole: Use every letter
+            shortest: Fewest letters in a word
+            select: End mask of the lexicons (Default value = None for all)
 
         Returns:
             A generator of all words found.
         """
+        index = self.index_anagrams()
+        coder = self._alphabet
+        rack = Rack(coder.encode_letters(letters))
+        alphabet = sorted(code for code in self.root if code != coder.sep)
+        codes = sorted(set(code for code in rack.codes() if code != BLANK))
+        counts = [rack.counts[code] for code in codes]
+
+        ranges = [(count,) if whole else range(count + 1) for count in counts]
+        seen = set()
+        for picks in itertools.product(*ranges):
+            chosen = [code for code, n in zip(codes, picks) for _ in range(n)]
+            for used in (rack.blanks,) if whole else range(rack.blanks + 1):
+                for fill in itertools.combinations_with_replacement(alphabet, used):
+                    signature, _ = self._anagram_entry(chosen + list(fill))
+                    if len(signature) < shortest or signature in seen:
+                        continue
+                    seen.add(signature)
+                    for entry in index.get(signature, ()):
+                        word = list(map(ord, entry))
+                        if select is None or self._has(word, select):
+                            yield coder.decode(word)
 
-        start_node = self.root.follow(sub[::-1])
-        if start_node is None:
-            return set()
+    # ------------------------------------------------------------------------------
+    # Batches of searches
 
-        try:
-            return self._crawl_lett_patt(start_node, sub, letters, pattern, no=0, pos=0)
-        except TypeError:
-            return set()
+    def search_job(self, job):
+        """
+        Run a search given as (search name, args...) eg ("contains_lett", "ab", "rstlne").
 
-    def _crawl_lett_patt(self, *args, no=0,
-                         pos=0, found_words=None, wrapped=False):
+        Returns:
+            A list of the results.
         """
-        Recursively search the GADDAG for all words containing pattern of letters
-        starting at a given node.
+        name, args = job[0], job[1:]
+        if name not in BATCH_SEARCHES:
+            raise ValueError("{} is not a batch search".format(name))
+        return list(getattr(self, name)(*args))
+
+    def search_batch(self, jobs, processes=None, chunksize=16):
+        """
+        Run many searches on a pool of processes sharing this GADDAG.
+        Where processes can be forked they inherit the GADDAG, otherwise
+        it must have been opened with mapload so that each one maps the
+        same file. Either way it is never pickled.
 
         Args:
-            args must contain:
-                node: The node to start the search at.
-                partial_word: The characters built up so far from traversing edges.
-                letters: list of allowed letters
-                pattern: Dictionary of letters and position (Default value = None)
-            keyword parameters:
-                no: Number of letters added as prefix (Default value = 0)
-                pos: No added as suffix (Default value = 0)
-                found_words: List of words found so far (Default value = None)
-                wrapped: Has the node which signifies the start of the word been
-                located (Default value = False)
+            jobs: An iterable of (search name, args...), see search_job
+                  and BATCH_SEARCHES
+            processes: Number of processes (Default value = None for one per CPU),
+                       1 to run the searches in this process
+            chunksize: Number of jobs sent to a process at a time
 
         Returns:
-            A generator of all (no letters added as prefix, word) found.
+            A generator of the list of results of each job, in the order of jobs.
         """
-        node, partial_word, letters, pattern = args
+        global _batch_gaddag
+        if processes == 1:
+            for job in jobs:
+                yield self.search_job(job)
+            return
 
-        if found_words is None:
-            found_words = set()
+        if 'fork' in multiprocessing.get_all_start_methods():
+            # Worked out first so that the processes share the node information
+            self._node_info()
+            context = multiprocessing.get_context('fork')
+            filename = None
+            _batch_gaddag = self
+        else:
+            context = multiprocessing.get_context('spawn')
+            filename = self._root.store.filename if self.compacted else None
+            if filename is None:
+                raise ValueError("GADDAG must be opened with mapload to search in batches here")
 
-        if node.is_end and ''.join(partial_word) not in found_words:
-            found_words.add(''.join(partial_word))
-            yield no, partial_word
+        try:
+            with context.Pool(processes, _start_batch, (filename,)) as pool:
+                _batch_gaddag = None
+                yield from pool.imap(_run_batch_job, jobs, chunksize)
+        finally:
+            _batch_gaddag = None
 
-        for char in node:
-            next_node = node[char]
+    # ------------------------------------------------------------------------------
+    # Asyncio interrogation
 
-            # Conditions required as tuple
-            conditions = (not letters or (letters and (char in letters or ' ' in letters)),
-                          pattern and pos in pattern,
-                          pattern and pos in pattern and pattern[pos] == char)
+    async def asearch(self, name, *args, interval=1000):
+        """
+        Run a search from an asyncio task, handing control back to the
+        event loop after every interval nodes visited so that other tasks
+        carry on during a long search. The query cache is not used, and
+        the GADDAG must not be changed until the search is finished.
 
-            if char == "+":
-                for word in self._crawl_lett_patt(next_node, partial_word, letters,
-                                                  pattern, no=no, pos=pos,
-                                                  found_words=found_words, wrapped=True):
-                    yield word
+        Args:
+            name: Name of the search, one of BATCH_SEARCHES
+            args: Arguments of the search
+            interval: Nodes visited between pauses (Default value = 1000)
 
+        Returns:
+            An async generator of all words found, as the search returns them.
+        """
+        if name not in BATCH_SEARCHES:
+            raise ValueError("{} is not a batch search".format(name))
+        search = getattr(type(self), name)
+        search = getattr(search, '__wrapped__', search)
+
+        # The walk reads the interval when it is first advanced
+        self._pause = interval
+        try:
+            found = iter(search(self, *args))
+            first = next(found, _PAUSE)
+        finally:
+            self._pause = None
+
+        for item in itertools.chain((first,), found):
+            if item is _PAUSE:
+                await asyncio.sleep(0)
             else:
-                # Add letter after partial_word (no of characters after sub in pos)
-                if wrapped and (conditions[2] or (not conditions[1] and conditions[0])):
-                    new_partial_word = partial_word[:]
-                    new_partial_word.append(char)
-                    for word in self._crawl_lett_patt(next_node, new_partial_word,
-                                                      self.get_newlist(char, letters,
-                                                                       letters and not conditions[2]),
-                                                      pattern, no=no,
-                                                      pos=pos + 1, found_words=found_words,
-                                                      wrapped=wrapped):
-                        yield word
-                # Add letter before partial_word (no of characters before sub in no)
-                elif not wrapped and conditions[0]:
-                    new_partial_word = partial_word[:]
-                    new_partial_word.insert(0, char)
-                    for word in self._crawl_lett_patt(next_node, new_partial_word,
-                                                      self.get_newlist(char, letters, letters),
-                                                      pattern, no=no + 1,
-                                                      pos=pos, found_words=found_words,
-                                                      wrapped=wrapped):
-                        yield word
-
-    def find_lett_patt(self, letters=None, pattern=None):
+                yield item
+
+    def acontains(self, sub, interval=1000, lexicons=None):
         """
-        Find all words containing a pattern of letters.
+        Find all words containing a substring from an asyncio task, see asearch.
 
-        Args:
-            letters: list of allowed letters,
-            pattern: A text pattern string of fixed length
-                     - for any letter eg "---a--"
+        Returns:
+            An async generator of all words found.
+        """
+        return self.asearch('contains', sub, lexicons, interval=interval)
+
+    def astarts_with(self, prefix, interval=1000, lexicons=None):
+        """
+        Find all words starting with a prefix from an asyncio task, see asearch.
 
         Returns:
-            A generator of all words found.
+            An async generator of all words found.
         """
-        start_node = self.root
-        if start_node is None:
-            return set()
+        return self.asearch('starts_with', prefix, lexicons, interval=interval)
 
-        for char in pattern:
-            if char.isalpha():
-                letters.append(char)
+    def aends_with(self, suffix, interval=1000, lexicons=None):
+        """
+        Find all words ending with a suffix from an asyncio task, see asearch.
 
-        try:
-            return self._crawl_find_lett_patt(start_node, [], letters, pattern)
-        except TypeError:
-            return set()
+        Returns:
+            An async generator of all words found.
+        """
+        return self.asearch('ends_with', suffix, lexicons, interval=interval)
 
-    def _crawl_find_lett_patt(self, node, partial_word, letters, pattern, found_words=None, wrapped=False):
+    # ------------------------------------------------------------------------------
+    # Regular expression interrogation
+
+    def find_regex(self, expression, letters=None, lexicons=None):
         """
-        Recursively search the GADDAG for all words containing pattern of letters
-        starting at a given node.
+        Find all words matching a regular expression, see Automaton for
+        the syntax. The search starts from the run of plain letters in the
+        expression with the fewest ways through it, or if there is none
+        from the end of the words allowing fewer letters, and the rest of
+        the expression is matched as the words are grown out from there.
+        Each letter of the expression is one character, so a tile of
+        several characters of a custom Alphabet cannot be matched.
 
         Args:
-            args must contain:
-                node: The node to start the search at.
-                partial_word: The characters built up so far from traversing edges.
-                letters: list of allowed letters
-                pattern: Fixed length pattern as string
-            keyword parameters:
-                found_words: List of words found so far (Default value = None)
-                wrapped: Has the node which signifies the start of the word been
+            expression: A regular expression matching the whole word eg "[aeiou]{2}.*s"
+            letters: Rack or list of letters that all the letters of the
+                     word are taken from, ' ' for a blank (Default value = None for any)
+            lexicons: Lexicons to search, see lexicon_mask (Default value = None for all)
 
         Returns:
-            A generator of all (no letters added as prefix, word) found.
-        """
-
-        if found_words is None:
-            found_words = set()
-
-        if node.is_end and ''.join(partial_word) not in found_words:
-            # print(partial_word, pattern, self.check_pattern(partial_word, pattern))
-            if self.check_pattern(partial_word, pattern):
-                found_words.add(''.join(partial_word))
-                yield partial_word
-
-        for char in node:
-            next_node = node[char]
-
-            if char == "+":
-                for word in self._crawl_find_lett_patt(next_node, partial_word, letters, pattern,
-                                                       found_words=found_words, wrapped=True):
-                    yield word
-            elif char in letters and len(partial_word) < len(pattern):
-                new_partial_word = partial_word[:]
-                if wrapped:
-                    new_partial_word.append(char)
-                    new_letters = self.get_newlist(char, letters, letters)
-                else:
-                    new_partial_word.insert(0, char)
-                    new_letters = self.get_newlist(char, letters, letters)
-                for word in self._crawl_find_lett_patt(next_node, new_partial_word, new_letters, pattern,
-                                                       found_words=found_words, wrapped=wrapped):
-                    yield word
+            A generator of all words found.
+        """
+        select = self.lexicon_mask(lexicons)
+        alphabet = self._alphabet
+        tree = Automaton.encode(Automaton.parse(expression), alphabet)
+        if letters is not None:
+            letters = alphabet.encode_letters(letters)
+        items = tree[1] if tree[0] == 'cat' else (tree,)
+
+        # Runs of plain letters at the top level of the expression
+        runs = []
+        i = 0
+        while i < len(items):
+            j = i
+            while j < len(items) and Automaton.letter(items[j]) is not None:
+                j += 1
+            if j > i:
+                runs.append((i, j))
+            i = j + 1
+
+        # Without one, words are read from whichever end allows fewer letters
+        if not runs:
+            forward = Automaton(tree)
+            backward = Automaton(Automaton.reverse(tree))
+            if backward.width() < forward.width():
+                return self._walk(self.root, [], ends=True, letters=letters, automaton=(backward, None),
+                                  select=select)
+            return self._walk(self.root, [], letters=letters, automaton=(None, forward), select=select)
+
+        info = self._node_info()
+        best = None
+        for i, j in runs:
+            sub = [Automaton.letter(item) for item in items[i:j]]
+            if i == 0 and j == len(items):
+                return iter([alphabet.decode(sub)]) \
+                    if self._has(sub, select) and (letters is None or Rack(letters).fits(sub)) else set()
+
+            node = self.root.follow(sub[::-1])
+            if node is not None and i == 0:
+                node = node[alphabet.sep] if alphabet.sep in node else None
+            if node is None:
+                return set()
+            words = info(node)[2]
+            if best is None or words < best[0]:
+                best = (words, i, j, sub, node)
+
+        _, i, j, sub, node = best
+        if letters is not None:
+            letters = Rack(letters)
+            for char in sub:
+                if letters.take(char) is None:
+                    return set()
+
+        backward = Automaton(Automaton.reverse(('cat', items[:i]))) if i > 0 else None
+        forward = Automaton(('cat', items[j:])) if j < len(items) else None
+        return self._walk(node, sub, wrapped=i == 0, ends=j == len(items), letters=letters,
+                          automaton=(backward, forward), select=select)
+
+    def find_glob(self, pattern, letters=None, lexicons=None):
+        """
+        Find all words matching a glob pattern.
+
+        Args:
+            pattern: ? for any letter, * for any letters, [abc] and [!abc]
+                     for sets of letters eg "?a*ing"
+            letters: Rack or list of letters that all the letters of the
+                     word are taken from, ' ' for a blank (Default value = None for any)
+            lexicons: Lexicons to search, see lexicon_mask (Default value = None for all)
+
+        Returns:
+            A generator of all words found.
+        """
+        return self.find_regex(Automaton.glob(pattern), letters, lexicons)
 
     @staticmethod
     def check_pattern(partial_word, pattern):
@@ -813,19 +2442,785 @@ class GADDAG:
         return new_list
 
 
+class QueryCache:
+    """
+    Results of GADDAG searches, with the least recently used dropped
+    first once there are more than entries results or size bytes of them.
+    """
+
+    def __init__(self, entries=1024, size=None):
+        self.entries = entries
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._bytes = 0
+        self._results = OrderedDict()  # key: (result, bytes)
+
+    def __len__(self):
+        return len(self._results)
+
+    def __contains__(self, key):
+        return key in self._results
+
+    @property
+    def bytes(self):
+        """Returns the estimated size of the results held."""
+        return self._bytes
+
+    def get(self, key):
+        """
+        Find the result of a search and count the hit or miss.
+
+        Returns:
+            The result, or `None` if it is not held.
+        """
+        try:
+            result, _ = self._results[key]
+        except KeyError:
+            self.misses += 1
+            return None
+
+        self._results.move_to_end(key)
+        self.hits += 1
+        return result
+
+    def put(self, key, result):
+        """
+        Hold the result of a search, dropping older results if over the limits.
+
+        Args:
+            key: The search and its arguments
+            result: A tuple of words or (no, word), words as tuples of symbols
+        """
+        size = sys.getsizeof(result) + sum(
+            sys.getsizeof(item) + (sys.getsizeof(item[1]) if isinstance(item[0], int) else 0)
+            for item in result)
+        if self.size is not None and size > self.size:
+            return
+
+        if key in self._results:
+            self._bytes -= self._results.pop(key)[1]
+        self._results[key] = (result, size)
+        self._bytes += size
+
+        while (self.entries is not None and len(self._results) > self.entries) \
+                or (self.size is not None and self._bytes > self.size):
+            self._bytes -= self._results.popitem(last=False)[1][1]
+
+    def clear(self):
+        """Drop all results, keeping the hit and miss counts."""
+        self._results.clear()
+        self._bytes = 0
+
+    def stats(self):
+        """
+        Returns:
+            A dictionary of hits, misses, entries and bytes held.
+        """
+        return {'hits': self.hits, 'misses': self.misses,
+                'entries': len(self._results), 'bytes': self._bytes}
+
+
+class Scorer:
+    """
+    Scores words for the score ranked searches, keeps the best of them
+    and bounds the score still reachable from part of a word, so that a
+    search can drop branches that cannot beat the lowest score kept.
+    """
+
+    def __init__(self, scores, pattern=None, premiums=None):
+        """
+        Args:
+            scores: Dictionary of letter: score
+            pattern: Pattern of fixed length, if the words fill one
+            premiums: Premium of each position of the pattern, d and t for
+                      double and triple letter, D and T for double and triple word
+        """
+        self.scores = scores
+        self.pattern = pattern
+        self.threshold = None
+        self.top = max(scores.values(), default=0)
+        self._values = {}  # rack counts: scores of the tiles, highest first
+        self._rest = {}  # positions filled: (fixed letter scores, multipliers) of the others
+
+        # Letter multiplier of each position, and the word multiplier
+        # of the whole pattern, as every - position will be filled
+        self.letter = [1] * len(pattern or ())
+        self.word = 1
+        for pos, premium in enumerate(premiums or ()):
+            if pattern[pos] == "-":
+                self.letter[pos] = {'d': 2, 't': 3}.get(premium, 1)
+                self.word *= {'D': 2, 'T': 3}.get(premium, 1)
+
+    def value(self, char, tile, pos):
+        """
+        Returns the score of a letter before the word multiplier.
+
+        Args:
+            char: The letter
+            tile: The tile taken from the rack for it, ' ' for a blank
+            pos: Position in the pattern, None without a pattern
+        """
+        if tile == BLANK:
+            return 0
+        value = self.scores.get(char, 0)
+        if pos is not None:
+            value *= self.letter[pos]
+        return value
+
+    def total(self, score):
+        """Returns the score of a word with the word multiplier."""
+        return score * self.word
+
+    def bound(self, score, rack, left, low, high):
+        """
+        Returns the highest score a word can reach.
+
+        Args:
+            score: Score of the letters so far, before the word multiplier
+            rack: Rack of the tiles left, None for any letters
+            left: Most letters still to be added
+            low, high: The positions low to high - 1 of the pattern are
+                       filled, None without a pattern
+        """
+        if rack is None:
+            values = itertools.repeat(self.top)
+        else:
+            key = tuple(rack.counts)
+            values = self._values.get(key)
+            if values is None:
+                values = sorted((self.scores.get(char, 0) for char in rack.codes() if char != BLANK),
+                                reverse=True)
+                self._values[key] = values
+
+        if self.pattern is None:
+            return score + sum(itertools.islice(values, left))
+
+        rest = self._rest.get((low, high))
+        if rest is None:
+            positions = list(itertools.chain(range(low), range(high, len(self.pattern))))
+            fixed = sum(self.scores.get(self.pattern[pos], 0) for pos in positions if self.pattern[pos] != "-")
+            multipliers = sorted((self.letter[pos] for pos in positions if self.pattern[pos] == "-"), reverse=True)
+            self._rest[low, high] = rest = (fixed, multipliers)
+        fixed, multipliers = rest
+        return (score + fixed + sum(m * v for m, v in zip(multipliers, values))) * self.word
+
+    def best(self, found, count):
+        """
+        Keep the count highest scoring words, raising the threshold
+        as the search goes on.
+
+        Args:
+            found: A generator of (score, word) from a search with this scorer
+            count: Number of words wanted
+
+        Returns:
+            A list of (score, word), highest score first.
+        """
+        heap = []
+        kept = {}  # word: its score in heap, as a word can be found with blanks on different squares
+        for score, word in found:
+            word = tuple(word)
+            if word in kept:
+                if score <= kept[word]:
+                    continue
+                heap.remove((kept[word], word))
+                heapq.heapify(heap)
+            elif len(heap) == count:
+                if (score, word) <= heap[0]:
+                    continue
+                del kept[heapq.heappop(heap)[1]]
+            heapq.heappush(heap, (score, word))
+            kept[word] = score
+            if len(heap) == count:
+                self.threshold = heap[0][0]
+        return [(score, list(word)) for score, word in sorted(heap, key=lambda item: (-item[0], item[1]))]
+
+
+class Automaton:
+    """
+    Position automaton of a restricted regular expression, run as a DFA
+    whose states (frozen sets of positions) are made as they are reached.
+
+    The expression must match the whole word. It may use letters,
+    . for any letter, [abc], [a-z] and [^abc] for sets of letters,
+    ( ) for groups, | between alternatives and the repeats *, +, ?,
+    {m}, {m,} and {m,n}. A special character is taken as a letter after \\.
+
+    Expressions are parsed to trees of tuples:
+        ('set', letters, negated), ('cat', items), ('alt', items),
+        ('star', item) and ('opt', item)
+    """
+    SPECIAL = '.[]()|*+?{}\\'
+
+    def __init__(self, tree):
+        """
+        Args:
+            tree: The parsed expression.
+        """
+        # Position 0 is the start, each other one a set in the tree
+        self.sets = [None]
+        self.follow = [set()]
+        first, last, nullable = self._linearise(tree)
+        self.follow[0] = first
+        self.accepting = frozenset(last | {0} if nullable else last)
+        self.start = frozenset([0])
+        self._steps = {}
+        self._lengths = {}
+
+        # Fewest and most letters from each position to the end of a match.
+        # Without loops the most is settled after size rounds; anything
+        # still growing after that leads into a loop and has no limit
+        size = len(self.sets)
+        shortest = self._shortest = [0 if p in self.accepting else sys.maxsize for p in range(size)]
+        longest = self._longest = [0 if p in self.accepting else -1 for p in range(size)]
+        for rounds in range(2 * size + 2):
+            changed = False
+            for q in range(size):
+                for p in self.follow[q]:
+                    if shortest[p] + 1 < shortest[q]:
+                        shortest[q] = shortest[p] + 1
+                        changed = True
+                    if longest[p] >= 0:
+                        length = sys.maxsize if rounds >= size or longest[p] == sys.maxsize else longest[p] + 1
+                        if length > longest[q]:
+                            longest[q] = length
+                            changed = True
+            if not changed:
+                break
+
+    def _linearise(self, tree):
+        """
+        Number the sets in a tree as positions and fill in follow.
+
+        Returns:
+            (first positions, last positions, `True` if it matches no letters)
+        """
+        kind = tree[0]
+        if kind == 'set':
+            self.sets.append(tree[1:])
+            self.follow.append(set())
+            position = len(self.sets) - 1
+            return {position}, {position}, False
+
+        if kind == 'cat':
+            first, last, nullable = set(), set(), True
+            for item in tree[1]:
+                item_first, item_last, item_nullable = self._linearise(item)
+                for p in last:
+                    self.follow[p] |= item_first
+                if nullable:
+                    first |= item_first
+                last = last | item_last if item_nullable else item_last
+                nullable = nullable and item_nullable
+            return first, last, nullable
+
+        if kind == 'alt':
+            first, last, nullable = set(), set(), False
+            for item in tree[1]:
+                item_first, item_last, item_nullable = self._linearise(item)
+                first |= item_first
+                last |= item_last
+                nullable = nullable or item_nullable
+            return first, last, nullable
+
+        first, last, _ = self._linearise(tree[1])
+        if kind == 'star':
+            for p in last:
+                self.follow[p] |= first
+        return first, last, True
+
+    def step(self, state, char):
+        """
+        Returns the state reached from state by char, or `None` if no match
+        can go on from there.
+        """
+        try:
+            return self._steps[state, char]
+        except KeyError:
+            sets = self.sets
+            reached = frozenset(p for q in state for p in self.follow[q]
+                                if (char in sets[p][0]) != sets[p][1])
+            self._steps[state, char] = reached = reached or None
+            return reached
+
+    def accepts(self, state):
+        """Returns `True` if a match can end at state."""
+        return not self.accepting.isdisjoint(state)
+
+    def lengths(self, state):
+        """
+        Returns (fewest, most) letters still needed to finish a match from
+        state, most being sys.maxsize if there is no limit.
+        """
+        try:
+            return self._lengths[state]
+        except KeyError:
+            lengths = (min(self._shortest[p] for p in state), max(self._longest[p] for p in state))
+            self._lengths[state] = lengths
+            return lengths
+
+    def width(self):
+        """
+        Returns the number of letters a match can start with,
+        sys.maxsize if it can start with any letter outside a set.
+        """
+        if 0 in self.accepting:
+            return sys.maxsize
+        return sum(sys.maxsize if self.sets[p][1] else len(self.sets[p][0]) for p in self.follow[0])
+
+    def matches(self, chars):
+        """Returns `True` if the expression matches all of chars."""
+        state = self.start
+        for char in chars:
+            state = self.step(state, char)
+            if state is None:
+                return False
+        return self.accepts(state)
+
+    @staticmethod
+    def letter(tree):
+        """Returns the letter if tree matches one letter only, otherwise `None`."""
+        if tree[0] == 'set' and not tree[2] and len(tree[1]) == 1:
+            return next(iter(tree[1]))
+        return None
+
+    @classmethod
+    def reverse(cls, tree):
+        """Returns the tree of the expression matching the reversed words."""
+        kind = tree[0]
+        if kind == 'set':
+            return tree
+        if kind == 'cat':
+            return kind, tuple(cls.reverse(item) for item in reversed(tree[1]))
+        if kind == 'alt':
+            return kind, tuple(cls.reverse(item) for item in tree[1])
+        return kind, cls.reverse(tree[1])
+
+    @classmethod
+    def encode(cls, tree, alphabet):
+        """Returns the tree with the letters of its sets replaced by their codes in alphabet."""
+        kind = tree[0]
+        if kind == 'set':
+            return kind, frozenset(code for code in map(alphabet.code, tree[1]) if code >= 0), tree[2]
+        if kind in ('cat', 'alt'):
+            return kind, tuple(cls.encode(item, alphabet) for item in tree[1])
+        return kind, cls.encode(tree[1], alphabet)
+
+    @staticmethod
+    def glob(pattern):
+        """
+        Returns the regular expression of a glob pattern:
+        ? for any letter, * for any letters, [abc] and [!abc] for sets of letters.
+        """
+        expression = []
+        i = 0
+        while i < len(pattern):
+            char = pattern[i]
+            if char == '?':
+                expression.append('.')
+            elif char == '*':
+                expression.append('.*')
+            elif char == '[':
+                end = pattern.find(']', i + 2)
+                if end < 0:
+                    raise ValueError("Unclosed [ in {!r}".format(pattern))
+                letters = pattern[i + 1:end]
+                if letters.startswith('!'):
+                    letters = '^' + letters[1:]
+                expression.append('[' + letters + ']')
+                i = end
+            else:
+                expression.append('\\' + char if char in Automaton.SPECIAL else char)
+            i += 1
+        return ''.join(expression)
+
+    @classmethod
+    def parse(cls, expression):
+        """
+        Returns the tree of a regular expression.
+
+        Raises:
+            ValueError: If the expression is not valid.
+        """
+        tree, i = cls._alternatives(expression, 0)
+        if i < len(expression):
+            raise ValueError("Unexpected {!r} at {} in {!r}".format(expression[i], i, expression))
+        return tree
+
+    @classmethod
+    def _alternatives(cls, expression, i):
+        """Parse alternatives separated by |, returning (tree, next position)."""
+        items = []
+        while True:
+            tree, i = cls._sequence(expression, i)
+            items.append(tree)
+            if i >= len(expression) or expression[i] != '|':
+                break
+            i += 1
+        return (items[0] if len(items) == 1 else ('alt', tuple(items))), i
+
+    @classmethod
+    def _sequence(cls, expression, i):
+        """Parse repeated atoms up to | or ), returning (tree, next position)."""
+        items = []
+        while i < len(expression) and expression[i] not in '|)':
+            tree, i = cls._atom(expression, i)
+            tree, i = cls._repeat(expression, i, tree)
+            items.append(tree)
+        return (items[0] if len(items) == 1 else ('cat', tuple(items))), i
+
+    @classmethod
+    def _atom(cls, expression, i):
+        """Parse a letter, set or group, returning (tree, next position)."""
+        char = expression[i]
+        if char == '(':
+            tree, i = cls._alternatives(expression, i + 1)
+            if i >= len(expression) or expression[i] != ')':
+                raise ValueError("Unclosed ( in {!r}".format(expression))
+            return tree, i + 1
+        if char == '[':
+            return cls._set(expression, i + 1)
+        if char == '.':
+            return ('set', frozenset(), True), i + 1
+        if char == '\\':
+            if i + 1 == len(expression):
+                raise ValueError("Trailing \\ in {!r}".format(expression))
+            return ('set', frozenset(expression[i + 1]), False), i + 2
+        if char in cls.SPECIAL:
+            raise ValueError("Unexpected {!r} at {} in {!r}".format(char, i, expression))
+        return ('set', frozenset(char), False), i + 1
+
+    @staticmethod
+    def _set(expression, i):
+        """Parse the inside of [ ], returning (tree, next position)."""
+        negated = expression.startswith('^', i)
+        if negated:
+            i += 1
+        letters = set()
+        start = i
+        while i < len(expression) and (expression[i] != ']' or i == start):
+            if i + 2 < len(expression) and expression[i + 1] == '-' and expression[i + 2] != ']':
+                letters.update(map(chr, range(ord(expression[i]), ord(expression[i + 2]) + 1)))
+                i += 3
+            else:
+                letters.add(expression[i])
+                i += 1
+        if i >= len(expression):
+            raise ValueError("Unclosed [ in {!r}".format(expression))
+        return ('set', frozenset(letters), negated), i + 1
+
+    @staticmethod
+    def _repeat(expression, i, tree):
+        """Parse any repeats after an atom, returning (tree, next position)."""
+        while i < len(expression) and expression[i] in '*+?{':
+            char = expression[i]
+            if char == '*':
+                tree = ('star', tree)
+            elif char == '+':
+                tree = ('cat', (tree, ('star', tree)))
+            elif char == '?':
+                tree = ('opt', tree)
+            else:
+                end = expression.find('}', i)
+                low, comma, high = expression[i + 1:end if end >= 0 else i].partition(',')
+                try:
+                    low = int(low)
+                    high = int(high) if high else None if comma else low
+                except ValueError:
+                    raise ValueError("Bad repeat at {} in {!r}".format(i, expression))
+                if high is not None and high < low:
+                    raise ValueError("Bad repeat at {} in {!r}".format(i, expression))
+                items = (tree,) * low
+                items += (('star', tree),) if high is None else (('opt', tree),) * (high - low)
+                tree = ('cat', items)
+                i = end
+            i += 1
+        return tree, i
+
+
+class Alphabet:
+    """ Maps the symbols of a lexicon to the small integers that label
+        the edges of the GADDAG, and back again
+
+        A symbol is a letter or a tile of several characters, such as
+        "ch" or "l·l", and words are split into symbols by taking the
+        longest tile at each position. The separator is code 0 and the
+        symbols are numbered from 1 in the order given. Without symbols
+        every character is its own symbol with its code point as code,
+        and "+" is the separator, as in GADDAGs saved before alphabets. """
+
+    def __init__(self, symbols=None, separator='+'):
+        """
+        Args:
+            symbols: The symbols in code order (Default value = None for
+                     every character, coded by code point)
+            separator: The symbol of the "+" edge (Default value = '+')
+        """
+        self.separator = separator
+        if symbols is None:
+            self.symbols = None
+            self.sep = ord(separator)
+            self._codes = None
+            self._tiles = ()
+            return
+
+        self.symbols = [separator] + [symbol for symbol in symbols if symbol != separator]
+        if len(set(self.symbols)) != len(self.symbols):
+            raise ValueError("Symbols of an alphabet must be distinct")
+        self.sep = 0
+        self._codes = {symbol: code for code, symbol in enumerate(self.symbols)}
+        self._tiles = sorted((symbol for symbol in self.symbols if len(symbol) > 1), key=len, reverse=True)
+
+    def __repr__(self):
+        if self.symbols is None:
+            return "Alphabet(separator={!r})".format(self.separator)
+        return "Alphabet({!r}, {!r})".format(self.symbols[1:], self.separator)
+
+    def __eq__(self, other):
+        if not isinstance(other, Alphabet):
+            return NotImplemented
+        return self.symbols == other.symbols and self.separator == other.separator
+
+    def __len__(self):
+        """Number of symbols, without the separator, 0 for code points."""
+        return 0 if self.symbols is None else len(self.symbols) - 1
+
+    def state(self):
+        """Returns (symbols, separator), enough to make the alphabet again."""
+        return None if self.symbols is None else self.symbols[1:], self.separator
+
+    def split(self, word):
+        """
+        Split a word into its symbols, the longest tile first.
+        A list or tuple is taken to be split already.
+        """
+        if not isinstance(word, str):
+            return list(word)
+        if not self._tiles:
+            return list(word)
+        symbols = []
+        i = 0
+        while i < len(word):
+            for tile in self._tiles:
+                if word.startswith(tile, i):
+                    symbols.append(tile)
+                    i += len(tile)
+                    break
+            else:
+                symbols.append(word[i])
+                i += 1
+        return symbols
+
+    def code(self, symbol, strict=False):
+        """
+        Returns the code of a symbol.
+
+        Args:
+            symbol: A symbol of the alphabet
+            strict: Raise an error for a symbol not in the alphabet,
+                    otherwise its code is -1, which labels no edge (Default value = False)
+
+        Raises:
+            ValueError: If strict and the symbol is not in the alphabet.
+        """
+        if self._codes is None:
+            if len(symbol) == 1:
+                return ord(symbol)
+        else:
+            code = self._codes.get(symbol)
+            if code is not None:
+                return code
+        if strict:
+            raise ValueError("{!r} is not in the alphabet".format(symbol))
+        return -1
+
+    def symbol(self, code):
+        """Returns the symbol of a code."""
+        return chr(code) if self._codes is None else self.symbols[code]
+
+    def encode(self, word, strict=False):
+        """
+        Returns the list of codes of a word, see split and code.
+        """
+        if self._codes is None and isinstance(word, str):
+            return [ord(char) for char in word]
+        return [self.code(symbol, strict) for symbol in self.split(word)]
+
+    def decode(self, codes):
+        """Returns the list of symbols of a list of codes."""
+        if self._codes is None:
+            return list(map(chr, codes))
+        symbols = self.symbols
+        return [symbols[code] for code in codes]
+
+    def encode_letters(self, letters):
+        """
+        Returns the codes of the letters of a rack, with BLANK kept as it
+        is and letters not in the alphabet, which can never be played, left out.
+
+        Args:
+            letters: Rack, list or string of letters, ' ' for a blank
+        """
+        codes = []
+        for symbol in self.split(letters):
+            if symbol == BLANK:
+                codes.append(BLANK)
+            else:
+                code = self.code(symbol)
+                if code >= 0:
+                    codes.append(code)
+        return codes
+
+    def encode_pattern(self, pattern):
+        """Returns a pattern of fixed length as a list of codes, with - kept as it is."""
+        return ['-' if symbol == '-' else self.code(symbol) for symbol in self.split(pattern)]
+
+
+# Alphabet of racks made without one, every character coded by code point
+_CODE_POINTS = Alphabet()
+
+
+class Rack:
+    """ The letters available to a letter limited search
+
+        Holds a count for each letter in a list indexed by its code in an
+        Alphabet and a separate count of blanks, so that a search can take
+        a letter and put it back in place as it moves through the GADDAG.
+        Letters are coded by the alphabet of the rack, so tiles of several
+        characters need the GADDAG's alphabet. The searches use racks of
+        codes, given as integers, in place of letters. """
+
+    def __init__(self, letters=None, alphabet=None):
+        """
+        Args:
+            letters: Rack, list or string of letters, ' ' for a blank (Default value = None)
+            alphabet: Alphabet coding the letters (Default value = None for code points)
+        """
+        self.counts = []
+        self.blanks = 0
+        self.alphabet = _CODE_POINTS if alphabet is None else alphabet
+
+        if letters is not None:
+            for char in self.alphabet.split(letters):
+                self.put(char)
+
+    def __repr__(self):
+        return "Rack({!r})".format(''.join(self))
+
+    def __len__(self):
+        return sum(self.counts) + self.blanks
+
+    def __iter__(self):
+        symbol = self.alphabet.symbol
+        for code, count in enumerate(self.counts):
+            for _ in range(count):
+                yield symbol(code)
+        for _ in range(self.blanks):
+            yield BLANK
+
+    def __contains__(self, char):
+        if char == BLANK:
+            return self.blanks > 0
+        code = char if char.__class__ is int else self.alphabet.code(char)
+        return 0 <= code < len(self.counts) and self.counts[code] > 0
+
+    def codes(self):
+        """Yield the code of each letter, then BLANK for each blank."""
+        for code, count in enumerate(self.counts):
+            for _ in range(count):
+                yield code
+        for _ in range(self.blanks):
+            yield BLANK
+
+    def copy(self):
+        """Return a new Rack with the same letters."""
+        rack = Rack(alphabet=self.alphabet)
+        rack.counts = self.counts[:]
+        rack.blanks = self.blanks
+        return rack
+
+    def put(self, tile):
+        """
+        Add a tile to the rack.
+
+        Args:
+            tile: A letter, a code or BLANK.
+
+        Raises:
+            ValueError: If the letter is not in the alphabet of the rack.
+        """
+        if tile == BLANK:
+            self.blanks += 1
+            return
+
+        code = tile if tile.__class__ is int else self.alphabet.code(tile, strict=True)
+        if code >= len(self.counts):
+            self.counts.extend([0] * (code + 1 - len(self.counts)))
+        self.counts[code] += 1
+
+    def take(self, char, blank=True):
+        """
+        Take a letter from the rack, or a blank to stand for it.
+
+        Args:
+            char: The letter or code wanted.
+            blank: Allow a blank to be used (Default value = True)
+
+        Returns:
+            The tile taken (char or BLANK), or None if there is neither.
+        """
+        code = char if char.__class__ is int else self.alphabet.code(char)
+        if 0 <= code < len(self.counts) and self.counts[code]:
+            self.counts[code] -= 1
+            return char
+        if blank and self.blanks:
+            self.blanks -= 1
+            return BLANK
+        return None
+
+    def fits(self, chars, blank=True):
+        """
+        Check whether all of chars can be taken from the rack.
+        The rack is left unchanged.
+
+        Args:
+            chars: Sequence of letters.
+            blank: Allow blanks to be used (Default value = True)
+        """
+        taken = []
+        for char in chars:
+            tile = self.take(char, blank)
+            if tile is None:
+                break
+            taken.append(tile)
+        for tile in taken:
+            self.put(tile)
+        return len(taken) == len(chars)
+
+
 class Node:
     """A node in a GADDAG."""
 
+    _shared = False
+    _info = None  # NodeInfo tuple, dropped whenever the node is changed or owned, see GADDAG._node_info
+
     def __init__(self, end=False):
         self._edges = {}
         self._end = end
 
+    def __getstate__(self):
+        if self._info is None:
+            return self.__dict__
+        state = dict(self.__dict__)
+        del state['_info']
+        return state
+
     def __str__(self):
-        return "[{}] {}".format(", ".join(sorted([edge for edge in self])), self._end)
+        return "[{}] {}".format(", ".join(map(str, sorted(self))), self._end)
 
     def __iter__(self):
-        for char in self._edges:
-            yield char
+        return iter(self._edges)
 
     def __len__(self):
         return len(self._edges)
@@ -837,10 +3232,10 @@ class Node:
         return self._edges[char]
 
     def __eq__(self, other):
-        if type(other) is not type(self):
+        if not isinstance(other, (Node, CompactNode)):
             return NotImplemented
 
-        if self.edges != other.edges or self.is_end != other.is_end:
+        if self.edges != other.edges or self.end != other.end:
             return False
 
         for child in self:
@@ -854,6 +3249,10 @@ class Node:
         """Return the edges of this node."""
         return {char for char in self} or None
 
+    def items(self):
+        """Return (char, node) for each edge of this node."""
+        return self._edges.items()
+
     @property
     def is_end(self):
         """Return `True` if this node is an end node, `False` otherwise."""
@@ -861,13 +3260,84 @@ class Node:
 
     @property
     def end(self):
-        """ Return `True` if this node is an end node, `False` otherwise."""
+        """ Return the end mask of the lexicons, true if this node is an end node."""
         return self._end
 
     @end.setter
     def end(self, value):
-        """ Set `True` if this node is an end node, `False` otherwise."""
+        """ Set the end mask of the lexicons, or `True` for the first one."""
         self._end = value
+        if self._info is not None:
+            self._info = None
+
+    @property
+    def shared(self):
+        """ Return `True` if this node may be reached by more than one edge
+            and must be copied before it is changed."""
+        return self._shared
+
+    @shared.setter
+    def shared(self, value):
+        """ Set `True` if this node may be reached by more than one edge."""
+        self._shared = value
+
+    def nbytes(self):
+        """ Return the bytes held by this node and its dictionary of edges,
+            not counting the nodes they lead to."""
+        return sys.getsizeof(self) + sys.getsizeof(self.__dict__) + sys.getsizeof(self._edges)
+
+    def signature(self):
+        """
+        Return a key that is equal for nodes with the same end mask and
+        edges leading to the same child objects.
+        """
+        edges = self._edges
+        if len(edges) == 1:
+            for char, child in edges.items():
+                return self._end, char, id(child)
+        return self.signature_of(self._end, sorted(edges.items(), key=lambda item: item[0]))
+
+    @staticmethod
+    def signature_of(end, edges):
+        """
+        Return the signature of a node not yet made, see signature.
+
+        Args:
+            end: The end mask of the node
+            edges: List of (char, child) sorted by char
+        """
+        if len(edges) == 1:
+            char, child = edges[0]
+            return end, char, id(child)
+        chars, children = zip(*edges) if edges else ((), ())
+        return end, chars, tuple(map(id, children))
+
+    def copy(self):
+        """
+        Return a new node with the same end flag and edges.
+        The children of this node become shared by the two nodes.
+        """
+        node = Node(self._end)
+        node._edges = dict(self._edges)
+        for child in self._edges.values():
+            child.shared = True
+        return node
+
+    def own(self, char):
+        """
+        Return the node on edge 'char', first replacing it with a private
+        copy if it is shared, so that it can be safely changed.
+
+        Args:
+            char: Character of the edge to follow.
+        """
+        if self._info is not None:
+            self._info = None
+        child = self._edges[char]
+        if child.shared:
+            child = child.copy()
+            self._edges[char] = child
+        return child
 
     def follow(self, chars):
         """
@@ -897,6 +3367,19 @@ class Node:
             dst: Node that the new edge will lead to.
         """
         self._edges[char] = dst
+        if self._info is not None:
+            self._info = None
+
+    def remove_edge(self, char):
+        """
+        Remove an edge of this node.
+
+        Args:
+            char: Character of the edge to be removed.
+        """
+        del self._edges[char]
+        if self._info is not None:
+            self._info = None
 
     def add_edge(self, char, dst=None, end=False):
         """
@@ -915,7 +3398,7 @@ class Node:
             dst = Node(end)
 
         if char in self:
-            return self[char]
+            return self.own(char)
 
         self.set_edge(char, dst)
         return dst
@@ -942,7 +3425,7 @@ class Node:
 
         return node
 
-    def add_end(self, char):
+    def add_end(self, char, end=True):
         """
         Create an end node on the edge 'char'.
 
@@ -951,16 +3434,453 @@ class Node:
 
         Args:
             char: The edge to create the end node on.
+            end: End mask of the lexicons (Default value = True for the first one)
         """
         if char in self:
-            self[char].end = True
+            node = self.own(char)
+            node.end = node.end | end
+        else:
+            self.add_edge(char, end=end)
+
+
+class CompactStore:
+    """ Read-only store holding all the nodes of a GADDAG in flat typed arrays
+
+        Nodes are numbered from 0 (the root). The edges of node i are
+        labels[first[i]:first[i + 1]], sorted Alphabet codes, leading to
+        the node ids in the same slice of targets. Bit i of ends is set
+        if node i is an end node. If any word is in a lexicon other than
+        the first, masks holds the end mask of every node, otherwise it
+        is None. Shared nodes are stored once.
+        A store opened from a binary file uses memoryviews of the mapped
+        file in place of the arrays. """
+
+    typecode = 'I'
+
+    def __init__(self, root=None):
+        self.mapped = None
+        self.filename = None
+        self.count = None
+        self.anagrams = None
+        self.lexicons = []
+        self.alphabet = None  # Alphabet.state(), None for code points
+        self.first = array(self.typecode, [0])
+        self.labels = array(self.typecode)
+        self.targets = array(self.typecode)
+        self.ends = bytearray()
+        self.masks = None
+        self._infos = None
+
+        if root is not None:
+            self._build(root)
+
+    def __len__(self):
+        return len(self.first) - 1
+
+    def __getstate__(self):
+        return {'first': self.first.tobytes(),
+                'labels': self.labels.tobytes(),
+                'targets': self.targets.tobytes(),
+                'ends': bytes(self.ends),
+                'masks': None if self.masks is None else self.masks.tobytes(),
+                'count': self.count,
+                'lexicons': self.lexicons,
+                'alphabet': self.alphabet}
+
+    def __setstate__(self, state):
+        for name in ('first', 'labels', 'targets'):
+            values = array(self.typecode)
+            values.frombytes(state[name])
+            setattr(self, name, values)
+        self.ends = bytearray(state['ends'])
+        self.masks = None
+        if state.get('masks') is not None:
+            self.masks = array(self.typecode)
+            self.masks.frombytes(state['masks'])
+        self.count = state.get('count')
+        self.lexicons = state.get('lexicons') or []
+        self.alphabet = state.get('alphabet')
+        self._infos = None
+        self.mapped = None
+        self.filename = None
+        self.anagrams = None
+
+    @property
+    def root(self):
+        """Returns a view of the root node."""
+        return CompactNode(self, 0)
+
+    # (attribute, section name) of each array in the binary format.
+    # Section META holds the other attributes as JSON, the optional
+    # section MASK the masks array and the optional section ANAG the
+    # anagram index as JSON, keyed as by GADDAG._anagram_entry
+    _sections = (('first', b'FRST'), ('labels', b'LABL'),
+                 ('targets', b'TRGT'), ('ends', b'ENDS'))
+
+    def write(self, filename):
+        """
+        Write the store in the binary format.
+        The file is written under a temporary name and then renamed,
+        so that a process mapping the old file is not disturbed.
+
+        Args:
+            filename: A path to write to.
+        """
+        bodies = []
+        for attr, name in self._sections:
+            values = getattr(self, attr)
+            if attr != 'ends' and sys.byteorder != 'little':
+                values = array(self.typecode, values)
+                values.byteswap()
+            bodies.append((name, bytes(values)))
+        if self.masks is not None:
+            masks = self.masks
+            if sys.byteorder != 'little':
+                masks = array(self.typecode, masks)
+                masks.byteswap()
+            bodies.append((b'MASK', bytes(masks)))
+        meta = {'count': self.count, 'lexicons': self.lexicons}
+        if self.alphabet is not None:
+            meta['alphabet'] = self.alphabet
+        bodies.append((b'META', json.dumps(meta).encode()))
+        if self.anagrams is not None:
+            bodies.append((b'ANAG', json.dumps(self.anagrams, separators=(',', ':')).encode()))
+
+        offset = BINARY_HEADER.size + BINARY_SECTION.size * len(bodies)
+        table = []
+        for name, body in bodies:
+            offset += -offset % 8
+            table.append(BINARY_SECTION.pack(name, zlib.crc32(body), offset, len(body)))
+            offset += len(body)
+
+        temp = "{}.tmp".format(filename)
+        with open(temp, 'wb') as f:
+            # Readers of version 1 would take every word to be in the first
+            # lexicon and every label to be a code point
+            version = BINARY_VERSION if self.masks is not None or self.alphabet is not None else 1
+            f.write(BINARY_HEADER.pack(BINARY_MAGIC, version, len(bodies)))
+            f.write(b''.join(table))
+            for _, body in bodies:
+                f.write(bytes(-f.tell() % 8))
+                f.write(body)
+        os.replace(temp, filename)
+
+    @classmethod
+    def open(cls, filename, verify=True):
+        """
+        Map a file written by write and use its sections as the arrays.
+
+        Args:
+            filename: A path to read from.
+            verify: Check the checksum of every section (Default value = True)
+
+        Returns:
+            The CompactStore.
+        """
+        with open(filename, 'rb') as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        view = memoryview(data)
+        sections = {}
+        for name, crc, offset, length in cls.table(data, filename):
+            sections[name] = view[offset:offset + length]
+            if verify and zlib.crc32(sections[name]) != crc:
+                raise ValueError("{} is corrupt: bad checksum for {}".format(filename, name.decode()))
+
+        store = cls()
+        store.mapped = data
+        store.filename = filename
+        for attr, name in cls._sections:
+            values = sections[name]
+            if attr != 'ends':
+                if sys.byteorder == 'little':
+                    values = values.cast(cls.typecode)
+                else:
+                    values = array(cls.typecode, values.tobytes())
+                    values.byteswap()
+            setattr(store, attr, values)
+
+        if b'MASK' in sections:
+            masks = sections[b'MASK']
+            if sys.byteorder == 'little':
+                store.masks = masks.cast(cls.typecode)
+            else:
+                store.masks = array(cls.typecode, masks.tobytes())
+                store.masks.byteswap()
+        if b'META' in sections:
+            meta = json.loads(sections[b'META'].tobytes().decode())
+            store.count = meta.get('count')
+            store.lexicons = meta.get('lexicons') or []
+            if meta.get('alphabet') is not None:
+                store.alphabet = tuple(meta['alphabet'])
+        if b'ANAG' in sections:
+            store.anagrams = json.loads(sections[b'ANAG'].tobytes().decode())
+        return store
+
+    @staticmethod
+    def table(data, filename=None):
+        """
+        Read the header and table of sections of a binary file.
+
+        Args:
+            data: The contents of the file, or at least its start.
+            filename: The path of the file, for the error messages.
+
+        Returns:
+            A list of (name, crc32, offset, length) for each section.
+        """
+        magic, version, number = BINARY_HEADER.unpack_from(data, 0)
+        if magic != BINARY_MAGIC:
+            raise ValueError("{} is not a binary GADDAG file".format(filename))
+        if version > BINARY_VERSION:
+            raise ValueError("{} has unsupported version {}".format(filename, version))
+        return [BINARY_SECTION.unpack_from(data, BINARY_HEADER.size + i * BINARY_SECTION.size)
+                for i in range(number)]
+
+    def _build(self, root):
+        """
+        Number the nodes reachable from root breadth first and fill the arrays.
+
+        Args:
+            root: Root Node of the GADDAG to be stored.
+        """
+        ids = {id(root): 0}
+        order = [root]
+        for node in order:
+            for char in sorted(node):
+                child = node[char]
+                if id(child) not in ids:
+                    ids[id(child)] = len(order)
+                    order.append(child)
+
+        self.ends = bytearray((len(order) + 7) // 8)
+        masks = array(self.typecode)
+        for i, node in enumerate(order):
+            for char in sorted(node):
+                self.labels.append(char)
+                self.targets.append(ids[id(node[char])])
+            self.first.append(len(self.labels))
+            if node.is_end:
+                self.ends[i >> 3] |= 1 << (i & 7)
+            if node.end >> 32:
+                raise ValueError("A CompactStore holds at most 32 lexicons")
+            masks.append(node.end)
+        if any(mask > 1 for mask in masks):
+            self.masks = masks
+
+    def infos(self, sep):
+        """
+        Returns the NodeInfo of every node as the arrays (shortest,
+        longest, words, letters) indexed by node id, worked out children
+        first the first time they are needed. They are not saved.
+
+        Args:
+            sep: Code of the "+" edge, which adds no letter
+        """
+        if self._infos is None:
+            first, labels, targets = self.first, self.labels, self.targets
+            size = len(self)
+            shortest = array('h', [NO_WORD.shortest]) * size
+            longest = array('h', [NO_WORD.longest]) * size
+            words = array('Q', [0]) * size
+            letters = array('Q', [0]) * size
+            done = bytearray(size)
+            stack = [(0, False)]
+            while stack:
+                i, expanded = stack.pop()
+                if done[i]:
+                    continue
+                if not expanded:
+                    stack.append((i, True))
+                    stack.extend((targets[k], False) for k in range(first[i], first[i + 1]) if not done[targets[k]])
+                    continue
+
+                done[i] = 1
+                low, high, count, below = (0, 0, 1, 0) if self.is_end(i) else NO_WORD
+                for k in range(first[i], first[i + 1]):
+                    j = targets[k]
+                    if not words[j]:
+                        continue
+                    step = 0 if labels[k] == sep else 1
+                    low = min(low, shortest[j] + step)
+                    high = max(high, longest[j] + step)
+                    count += words[j]
+                    below |= letters[j] | (step << (labels[k] & 63))
+                shortest[i], longest[i], words[i], letters[i] = low, high, count, below
+            self._infos = (shortest, longest, words, letters)
+
+        return self._infos
+
+    def is_end(self, i):
+        """Return `True` if node i is an end node."""
+        return bool(self.ends[i >> 3] & (1 << (i & 7)))
+
+    def end(self, i):
+        """Return the end mask of the lexicons of node i."""
+        if self.masks is None:
+            return int(self.is_end(i))
+        return self.masks[i]
+
+    def edge(self, i, char):
+        """
+        Follow the edge char from node i.
+
+        Returns:
+            The id of the node reached, or -1 if there is no such edge.
+        """
+        hi = self.first[i + 1]
+        k = bisect_left(self.labels, char, self.first[i], hi)
+        if k < hi and self.labels[k] == char:
+            return self.targets[k]
+        return -1
+
+    def nbytes(self):
+        """Return the bytes held by the arrays of the store."""
+        arrays = (self.first, self.labels, self.targets, self.ends) + \
+            (() if self.masks is None else (self.masks,))
+        return sum(memoryview(values).nbytes for values in arrays)
+
+    def to_nodes(self):
+        """
+        Rebuild the graph as Node objects, keeping shared nodes shared
+        and marking them to be copied on write.
+
+        Returns:
+            The root Node.
+        """
+        nodes = [Node(self.end(i)) for i in range(len(self))]
+        reached = set()
+        for i, node in enumerate(nodes):
+            for k in range(self.first[i], self.first[i + 1]):
+                target = self.targets[k]
+                if target in reached:
+                    nodes[target].shared = True
+                reached.add(target)
+                node.set_edge(self.labels[k], nodes[target])
+        return nodes[0]
+
+
+class CompactNode:
+    """A view of one node in a CompactStore with the interface of Node."""
+
+    __slots__ = ('store', 'id')
+
+    def __init__(self, store, i):
+        self.store = store
+        self.id = i
+
+    def __str__(self):
+        return "[{}] {}".format(", ".join(map(str, sorted(self))), self.is_end)
+
+    def __iter__(self):
+        store = self.store
+        for k in range(store.first[self.id], store.first[self.id + 1]):
+            yield store.labels[k]
+
+    def __len__(self):
+        return self.store.first[self.id + 1] - self.store.first[self.id]
+
+    def __contains__(self, char):
+        return self.store.edge(self.id, char) >= 0
+
+    def __getitem__(self, char):
+        i = self.store.edge(self.id, char)
+        if i < 0:
+            raise KeyError(char)
+        return CompactNode(self.store, i)
+
+    __eq__ = Node.__eq__
+
+    @property
+    def edges(self):
+        """Return the edges of this node."""
+        return {char for char in self} or None
+
+    def items(self):
+        """Return (char, node) for each edge of this node."""
+        store = self.store
+        return [(store.labels[k], CompactNode(store, store.targets[k]))
+                for k in range(store.first[self.id], store.first[self.id + 1])]
+
+    @property
+    def is_end(self):
+        """Return `True` if this node is an end node, `False` otherwise."""
+        return self.store.is_end(self.id)
+
+    @property
+    def end(self):
+        """Return the end mask of the lexicons, 0 if this node is not an end node."""
+        return self.store.end(self.id)
+
+    follow = Node.follow
+
+
+class ChunkedStream(io.BufferedReader):
+    """ A buffered stream that reads a file in large chunks and
+        reports progress after each one, for loading large files """
+
+    chunk_size = 1 << 20
+
+    def __init__(self, filename, progress=None, chunk_size=None):
+        raw = _ProgressReader(filename, progress)
+        super(ChunkedStream, self).__init__(raw, chunk_size or ChunkedStream.chunk_size)
+
+    @property
+    def done(self):
+        """ Bytes read from the file so far """
+        return self.raw.done
+
+    @property
+    def total(self):
+        """ Size of the file, None if it is not known """
+        return self.raw.total
+
+
+class _ProgressReader(io.RawIOBase):
+    """ Raw stream under ChunkedStream counting the bytes read """
+
+    def __init__(self, filename, progress):
+        super(_ProgressReader, self).__init__()
+        if isinstance(filename, (str, bytes, os.PathLike)):
+            self.handle = open(filename, 'rb')
+            self.owned = True
         else:
-            self.add_edge(char, end=True)
+            self.handle = filename
+            self.owned = False
+        try:
+            self.total = os.fstat(self.handle.fileno()).st_size
+        except (AttributeError, OSError, io.UnsupportedOperation):
+            self.total = None
+        self.progress = progress
+        self.done = 0
+        self.start = time.perf_counter()
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if hasattr(self.handle, 'readinto'):
+            size = self.handle.readinto(buffer)
+        else:
+            data = self.handle.read(len(buffer))
+            size = len(data)
+            buffer[:size] = data
+        self.done += size
+        if size and self.progress is not None:
+            elapsed = time.perf_counter() - self.start
+            self.progress("load", self.done, self.total, self.done / elapsed if elapsed else 0.0)
+        return size
+
+    def close(self):
+        if self.owned and not self.closed:
+            self.handle.close()
+        super(_ProgressReader, self).close()
 
 
 class OpenStream(io.BytesIO):
     """ A Stream class that allows event processing
-        during long operations """
+        during long operations
+        Superseded by ChunkedStream, which GADDAG.openload now uses """
 
     process_interval = 50000
 
@@ -1007,6 +3927,8 @@ class SafeUnpickler(pickle.Unpickler):
         # (module, class) as in pickled file: actual class reference
         (__name__, 'GADDAG'): GADDAG,
         (__name__, 'Node'): Node,
+        (__name__, 'CompactStore'): CompactStore,
+        (__name__, 'CompactNode'): CompactNode,
         ('__main__', 'GADDAG'): GADDAG,
         ('__main__', 'Node'): Node,
         ('pygaddag', 'Node'): Node,
@@ -1016,7 +3938,6 @@ class SafeUnpickler(pickle.Unpickler):
     def find_class(self, modname, clsname):
         """ Overriden find_class method """
 
-        print("DEBUG unpickling: %(modname)s . %(clsname)s" % locals())
         try:
             return SafeUnpickler._unpickle_map_safe[(modname, clsname)]
         except KeyError:
@@ -0,0 +1,531 @@
+""" Regression tests for pygaddag
+
+    python -m unittest test_pygaddag
+
+"""
+import os
+import re
+import gzip
+import pickle
+import random
+import asyncio
+import tempfile
+import unittest
+import fnmatch
+import itertools
+
+from pygaddag import GADDAG, Alphabet, Rack, BINARY_HEADER, BINARY_MAGIC, BINARY_SECTION
+from movegen import MoveGenerator, LETTER_SCORES, LETTER_MULTIPLIERS, WORD_MULTIPLIERS
+
+
+class TestOneLetterWords(unittest.TestCase):
+    """Words of one symbol added by add have a "+" edge at the root as well."""
+
+    def test_iterated_once(self):
+        gaddag = GADDAG()
+        for word in ('a', 'ab', 'ba'):
+            gaddag.add(word)
+        self.assertEqual(sorted(map(''.join, gaddag)), ['a', 'ab', 'ba'])
+        self.assertEqual(len(gaddag), 3)
+        self.assertEqual(list(gaddag.find_regex('.')), [['a']])
+
+    def test_tile_iterated_once(self):
+        gaddag = GADDAG(alphabet=Alphabet(['a', 'l', 'll']))
+        gaddag.add('ll')
+        self.assertEqual(list(gaddag), [['ll']])
+        self.assertEqual(len(gaddag), 1)
+
+
+class TestBestLettPatt(unittest.TestCase):
+    """A blank is put on the square where it loses least."""
+
+    def test_blank_on_lower_premium(self):
+        gaddag = GADDAG()
+        gaddag.build(['dab', 'dbcd', 'dcdd', 'dddb', 'ddcc'])
+        scores = {'a': 1, 'b': 3, 'c': 3, 'd': 2}
+        best = gaddag.best_lett_patt(list('dbddc '), 'd---', scores, 5, 'DDTt')
+        # ddcc: the blank on the T square as c, the real c tripled on the t square
+        self.assertIn((78, list('ddcc')), best)
+        self.assertEqual(len(best), len({tuple(word) for _, word in best}))
+
+
+class TestBestLett(unittest.TestCase):
+    """Scores match a brute force count on graphs whose "+" edge is not first."""
+
+    def test_added_out_of_order(self):
+        gaddag = GADDAG()
+        gaddag.add('bcac')
+        gaddag.add('caca')
+        self.assertEqual(gaddag.best_lett('a', list('cc b'), {'a': 1, 'b': 3, 'c': 5}),
+                         [(14, list('bcac')), (11, list('caca'))])
+
+    def test_random(self):
+        generator = random.Random(0)
+        scores = {'a': 1, 'b': 3, 'c': 5}
+        for _ in range(100):
+            words = {''.join(generator.choices('abc', k=generator.randint(2, 5))) for _ in range(12)}
+            gaddag = GADDAG()
+            for word in generator.sample(sorted(words), len(words)):
+                gaddag.add(word)
+            rack = generator.choices('abc ', k=5)
+            expected = []
+            for word in words:
+                if 'a' not in word:
+                    continue
+                free = list(word)
+                free.remove('a')
+                score, left = scores['a'], list(rack)
+                for char in sorted(free, key=scores.get, reverse=True):
+                    if char in left:
+                        left.remove(char)
+                        score += scores[char]
+                    elif ' ' in left:
+                        left.remove(' ')
+                    else:
+                        break
+                else:
+                    expected.append((score, word))
+            found = gaddag.best_lett('a', rack, scores, len(words))
+            self.assertEqual(sorted((score, ''.join(word)) for score, word in found), sorted(expected))
+
+
+class TestAnagrams(unittest.TestCase):
+    """The anagram index tells tiles of several characters apart."""
+
+    def test_tiles(self):
+        alphabet = Alphabet(['a', 'c', 'h', 'l', 'ch', 'll'])
+        gaddag = GADDAG(alphabet=alphabet)
+        gaddag.build(['lchla', 'chall', 'lcha', 'hall'], anagrams=True)
+        self.assertEqual(list(gaddag.anagrams(['ch', 'a', 'll'])), [['ch', 'a', 'll']])
+        # c and h are not the tile ch
+        self.assertEqual(list(gaddag.anagrams(['c', 'h', 'a', 'll'])), [])
+        gaddag.remove('chall')
+        self.assertEqual(list(gaddag.anagrams(['ch', 'a', 'll'])), [])
+        self.assertEqual(list(gaddag.anagrams(['a', 'l', 'ch'])), [['l', 'ch', 'a']])
+
+
+class TestCache(unittest.TestCase):
+    """Cached searches tell tiles of several characters from their characters."""
+
+    def test_tiles(self):
+        gaddag = GADDAG(alphabet=Alphabet(['a', 'c', 'h', 'ch']))
+        gaddag.add(['c', 'h', 'a'])
+        gaddag.add(['ch', 'a'])
+        gaddag.set_cache()
+        self.assertEqual(list(gaddag.starts_with(['c', 'h'])), [['c', 'h', 'a']])
+        self.assertEqual(list(gaddag.starts_with(['ch'])), [['ch', 'a']])
+        self.assertEqual(list(gaddag.contains_lett('a', ['c', 'h'])), [(2, ['c', 'h', 'a'])])
+        self.assertEqual(list(gaddag.contains_lett('a', ['ch'])), [(1, ['ch', 'a'])])
+
+
+class TestContainsMany(unittest.TestCase):
+    """A batch of words is lowered, as by in, before it is split into tiles."""
+
+    def test_upper_tiles(self):
+        gaddag = GADDAG(alphabet=Alphabet(['a', 'c', 'h', 'l', 'ch', 'll']))
+        gaddag.build(['lchla'])
+        self.assertIn('LCHLA', gaddag)
+        self.assertEqual(gaddag.contains_many(['LCHLA', 'lchla', ['L', 'CH', 'L', 'A'], 'lla']),
+                         [True, True, True, False])
+
+
+class TestBuild(unittest.TestCase):
+    """build reads a word list as create_from_file does and takes words as symbols."""
+
+    def test_word_list(self):
+        handle, filename = tempfile.mkstemp()
+        with os.fdopen(handle, 'w') as f:
+            f.write('ab\n\na\nabc\n')
+        try:
+            gaddag = GADDAG()
+            self.assertEqual(gaddag.build(filename), 2)
+            self.assertEqual(sorted(map(''.join, gaddag)), ['ab', 'abc'])
+        finally:
+            os.remove(filename)
+
+    def test_symbols(self):
+        gaddag = GADDAG(alphabet=Alphabet(['a', 'c', 'h', 'ch']))
+        self.assertEqual(gaddag.build([['ch', 'a'], ['c', 'h', 'a']]), 2)
+        self.assertEqual(sorted(gaddag), [['c', 'h', 'a'], ['ch', 'a']])
+
+
+class TestRemove(unittest.TestCase):
+    """Removed words leave no nodes behind and the words of other lexicons stay."""
+
+    def reachable(self, gaddag):
+        nodes, stack = {id(gaddag.root): gaddag.root}, [gaddag.root]
+        while stack:
+            for _, child in stack.pop().items():
+                if id(child) not in nodes:
+                    nodes[id(child)] = child
+                    stack.append(child)
+        return list(nodes.values())
+
+    def test_remove(self):
+        gaddag = GADDAG()
+        gaddag.build(['ab', 'abc', 'ba'])
+        gaddag.remove('abc')
+        self.assertEqual(sorted(map(''.join, gaddag)), ['ab', 'ba'])
+        self.assertEqual(len(gaddag), 2)
+        self.assertEqual(list(gaddag.starts_with('abc')), [])
+        with self.assertRaises(KeyError):
+            gaddag.remove('abc')
+
+    def test_random(self):
+        generator = random.Random(0)
+        for _ in range(50):
+            words = {''.join(generator.choices('abcd', k=generator.randint(2, 6))) for _ in range(40)}
+            other = set(generator.sample(sorted(words), 10))
+            gaddag = GADDAG()
+            gaddag.build(words)
+            gaddag.build(other, lexicon='other')
+            removed = set(generator.sample(sorted(words), 20))
+            self.assertEqual(gaddag.discard_many(sorted(removed) + ['dddddddd'], lexicons='default'), 20)
+            left = (words - removed) | other
+            self.assertEqual(sorted(map(''.join, gaddag)), sorted(left))
+            self.assertEqual(len(gaddag), len(left))
+            self.assertEqual(gaddag.contains_many(sorted(removed), lexicons='default'),
+                             [False] * len(removed))
+            self.assertEqual(gaddag.contains_many(sorted(other), lexicons='other'), [True] * len(other))
+            # No node is left without a word below it
+            self.assertTrue(all(node.is_end or len(node) for node in self.reachable(gaddag)))
+            gaddag.minimise()
+            fresh = GADDAG()
+            fresh.build(words - removed)
+            fresh.build(other, lexicon='other')
+            self.assertEqual(len(self.reachable(gaddag)), len(self.reachable(fresh)))
+
+
+class TestMerge(unittest.TestCase):
+    """A delta merged into a GADDAG or its file gives the GADDAG of the new word list."""
+
+    def setUp(self):
+        handle, self.filename = tempfile.mkstemp()
+        os.close(handle)
+
+    def tearDown(self):
+        os.remove(self.filename)
+
+    def check(self, gaddag, words, other=()):
+        fresh = GADDAG()
+        fresh.build(words)
+        if other:
+            fresh.build(other, lexicon='other')
+        self.assertEqual(sorted(map(''.join, gaddag)), sorted(map(''.join, fresh)))
+        self.assertEqual(len(gaddag), len(fresh))
+        self.assertEqual(gaddag.stats()['nodes'], fresh.stats()['nodes'])
+
+    def test_merge(self):
+        gaddag = GADDAG()
+        gaddag.build(['ab', 'abc', 'ba'])
+        self.assertEqual(gaddag.merge(added=['cab', 'ab', 'c', ''], removed=['abc', 'bb']), (1, 1))
+        self.check(gaddag, ['ab', 'ba', 'cab'])
+        self.assertEqual(gaddag.merge(added=['ba', 'bc'], lexicon='other'), (2, 0))
+        self.check(gaddag, ['ab', 'ba', 'cab'], ['ba', 'bc'])
+        self.assertEqual(gaddag.merge(removed=['ba'], lexicon='other'), (0, 1))
+        self.check(gaddag, ['ab', 'ba', 'cab'], ['bc'])
+
+    def test_tiles(self):
+        gaddag = GADDAG(alphabet=Alphabet(['a', 'c', 'h', 'ch']))
+        gaddag.build([['c', 'h', 'a']])
+        self.assertEqual(gaddag.merge(added=[['ch', 'a']]), (1, 0))
+        self.assertEqual(sorted(gaddag), [['c', 'h', 'a'], ['ch', 'a']])
+
+    def test_pickle_file(self):
+        gaddag = GADDAG()
+        gaddag.build(['ab', 'abc', 'ba'])
+        gaddag.save(self.filename)
+        self.assertEqual(GADDAG().merge_file(self.filename, added=['cab'], removed=['abc']), (1, 1))
+        loaded = GADDAG()
+        loaded.load(self.filename)
+        self.check(loaded, ['ab', 'ba', 'cab'])
+
+    def test_binary_file(self):
+        gaddag = GADDAG()
+        gaddag.build(['ab', 'abc', 'ba'])
+        gaddag.save_binary(self.filename)
+        delta = self.filename + '.delta'
+        with open(delta, 'w') as f:
+            f.write('cab\n\nc\nbc\n')
+        try:
+            self.assertEqual(GADDAG().merge_file(self.filename, added=delta, removed=['abc']), (2, 1))
+        finally:
+            os.remove(delta)
+        loaded = GADDAG()
+        loaded.mapload(self.filename)
+        self.assertTrue(loaded.compacted)
+        self.assertEqual(sorted(map(''.join, loaded)), ['ab', 'ba', 'bc', 'cab'])
+        self.assertEqual(len(loaded), 4)
+
+    def test_unchanged_file(self):
+        gaddag = GADDAG()
+        gaddag.build(['ab', 'ba'])
+        gaddag.save_binary(self.filename)
+        with open(self.filename, 'rb') as f:
+            saved = f.read()
+        self.assertEqual(GADDAG().merge_file(self.filename, added=['ab'], removed=['cd']), (0, 0))
+        with open(self.filename, 'rb') as f:
+            self.assertEqual(f.read(), saved)
+
+
+class TestAload(unittest.TestCase):
+    """aload unpickles as safeload does."""
+
+    def setUp(self):
+        handle, self.filename = tempfile.mkstemp()
+        os.close(handle)
+
+    def tearDown(self):
+        os.remove(self.filename)
+
+    def test_round_trip(self):
+        gaddag = GADDAG()
+        gaddag.build(['ab', 'abc', 'ba'])
+        gaddag.save(self.filename)
+        loaded = GADDAG()
+        asyncio.run(loaded.aload(self.filename))
+        self.assertEqual(sorted(map(''.join, loaded)), ['ab', 'abc', 'ba'])
+        self.assertEqual(len(loaded), 3)
+
+    def test_class_not_allowed(self):
+        with gzip.open(self.filename, 'wb') as f:
+            pickle.dump(os.getcwd, f)
+        with self.assertRaises(pickle.UnpicklingError):
+            asyncio.run(GADDAG().aload(self.filename))
+
+
+class TestFindRegex(unittest.TestCase):
+    """find_regex and find_glob find the words that re and fnmatch match."""
+
+    @classmethod
+    def expression(cls, generator, depth=0):
+        """Returns a random expression in the syntax both Automaton and re read alike."""
+        choice = generator.randrange(4 if depth < 3 else 2)
+        if choice == 0:
+            return generator.choice('abc.')
+        if choice == 1:
+            return generator.choice(['[ab]', '[^a]', '[a-b]', 'c', 'a'])
+        if choice == 2:
+            items = [cls.expression(generator, depth + 1) for _ in range(generator.randint(2, 4))]
+            return ''.join(items) if generator.random() < 0.6 else '(' + '|'.join(items) + ')'
+        item = cls.expression(generator, depth + 1)
+        return '({}){}'.format(item, generator.choice(['*', '+', '?', '{2}', '{1,3}', '{2,}']))
+
+    def test_random(self):
+        generator = random.Random(0)
+        words = sorted({''.join(generator.choices('abc', k=generator.randint(2, 7))) for _ in range(300)})
+        gaddag = GADDAG()
+        gaddag.build(words)
+        for _ in range(300):
+            expression = ''.join(self.expression(generator) for _ in range(generator.randint(2, 4)))
+            letters = generator.choice([None, generator.choices('abc ', k=5)])
+            expected = [word for word in words if re.fullmatch(expression, word)
+                        and (letters is None or Rack(letters).fits(word))]
+            found = sorted(map(''.join, gaddag.find_regex(expression, letters)))
+            self.assertEqual(found, expected, expression)
+
+    def test_glob(self):
+        generator = random.Random(1)
+        words = sorted({''.join(generator.choices('abc', k=generator.randint(2, 7))) for _ in range(300)})
+        gaddag = GADDAG()
+        gaddag.build(words)
+        for _ in range(300):
+            pattern = ''.join(generator.choice(['a', 'b', '?', '*', '[ab]', '[!a]'])
+                              for _ in range(generator.randint(1, 5)))
+            expected = [word for word in words if fnmatch.fnmatchcase(word, pattern)]
+            self.assertEqual(sorted(map(''.join, gaddag.find_glob(pattern))), expected, pattern)
+
+
+class TestBinary(unittest.TestCase):
+    """Files written by save_binary map back to the same GADDAG."""
+
+    def setUp(self):
+        handle, self.filename = tempfile.mkstemp()
+        os.close(handle)
+
+    def tearDown(self):
+        os.remove(self.filename)
+
+    def version(self):
+        with open(self.filename, 'rb') as f:
+            return BINARY_HEADER.unpack(f.read(BINARY_HEADER.size))[1]
+
+    def test_round_trip(self):
+        gaddag = GADDAG()
+        gaddag.build(['ab', 'abc', 'ba', 'cab'], anagrams=True)
+        gaddag.build(['ab', 'bc'], lexicon='other')
+        gaddag.save_binary(self.filename)
+        self.assertEqual(self.version(), 2)
+        loaded = GADDAG()
+        loaded.mapload(self.filename)
+        self.assertTrue(loaded.compacted)
+        self.assertEqual(sorted(loaded), sorted(gaddag))
+        self.assertEqual(len(loaded), 5)
+        self.assertEqual(loaded.lexicons, gaddag.lexicons)
+        self.assertEqual(sorted(map(''.join, loaded.contains('b', lexicons=['other']))), ['ab', 'bc'])
+        self.assertEqual(sorted(map(''.join, loaded.anagrams('abc'))), ['abc', 'cab'])
+        self.assertEqual(loaded.info(), gaddag.info())
+
+    def test_version_1(self):
+        # One lexicon and the default alphabet are left as the first version had them
+        gaddag = GADDAG()
+        gaddag.build(['ab', 'ba'])
+        gaddag.save_binary(self.filename)
+        self.assertEqual(self.version(), 1)
+        loaded = GADDAG()
+        loaded.mapload(self.filename)
+        self.assertEqual(sorted(map(''.join, loaded)), ['ab', 'ba'])
+
+    def test_alphabet(self):
+        gaddag = GADDAG(alphabet=Alphabet(['a', 'c', 'h', 'ch']))
+        gaddag.build([['ch', 'a'], ['c', 'h', 'a']])
+        gaddag.save_binary(self.filename)
+        self.assertEqual(self.version(), 2)
+        loaded = GADDAG()
+        loaded.mapload(self.filename)
+        self.assertEqual(sorted(loaded), [['c', 'h', 'a'], ['ch', 'a']])
+
+    def test_unsupported_version(self):
+        GADDAG().save_binary(self.filename)
+        with open(self.filename, 'r+b') as f:
+            f.write(BINARY_HEADER.pack(BINARY_MAGIC, 99, 0))
+        with self.assertRaises(ValueError):
+            GADDAG().mapload(self.filename)
+
+    def test_corrupt(self):
+        gaddag = GADDAG()
+        gaddag.build(['ab', 'abc', 'ba'])
+        gaddag.save_binary(self.filename)
+        with open(self.filename, 'r+b') as f:
+            f.seek(BINARY_HEADER.size)
+            name, crc, offset, length = BINARY_SECTION.unpack(f.read(BINARY_SECTION.size))
+            f.seek(offset)
+            byte = f.read(1)[0]
+            f.seek(offset)
+            f.write(bytes([byte ^ 0xFF]))
+        with self.assertRaises(ValueError):
+            GADDAG().mapload(self.filename)
+        with self.assertRaises(ValueError):
+            asyncio.run(GADDAG().aload(self.filename))
+        GADDAG().mapload(self.filename, verify=False)
+
+
+class TestMoveGenerator(unittest.TestCase):
+    """Moves match a brute force search of every placement on small boards."""
+
+    @staticmethod
+    def brute_force(words, board, rack, premiums, rack_size, bingo):
+        """Returns every legal move as found by MoveGenerator, tried square by square."""
+        size = len(board)
+        empty = all(square is None for row in board for square in row)
+        moves = []
+        for across in (True, False):
+            def square(line, pos):
+                return (line, pos) if across else (pos, line)
+
+            def at(line, pos):
+                row, col = square(line, pos)
+                return board[row][col]
+
+            def cross(line, pos, letter):
+                """The word at right angles through a letter put on (line, pos) and its tiles."""
+                upper, lower = [], []
+                i = line - 1
+                while i >= 0 and at(i, pos) is not None:
+                    upper.insert(0, at(i, pos))
+                    i -= 1
+                i = line + 1
+                while i < size and at(i, pos) is not None:
+                    lower.append(at(i, pos))
+                    i += 1
+                return upper + lower, ''.join(upper).lower() + letter + ''.join(lower).lower()
+
+            for line, start, end in itertools.product(range(size), range(size), range(size)):
+                squares = [at(line, pos) for pos in range(size)]
+                if end <= start or (start and squares[start - 1] is not None) \
+                        or (end + 1 < size and squares[end + 1] is not None):
+                    continue
+                free = [pos for pos in range(start, end + 1) if squares[pos] is None]
+                if not free or len(free) > len(rack):
+                    continue
+                if empty:
+                    if not start <= size // 2 <= end or line != size // 2:
+                        continue
+                elif len(free) == end - start + 1 and not any(cross(line, pos, '')[0] for pos in free):
+                    continue
+                for word in words:
+                    if len(word) != end - start + 1 or any(
+                            squares[pos] is not None and squares[pos].lower() != word[pos - start]
+                            for pos in range(start, end + 1)):
+                        continue
+                    crosses = {pos: cross(line, pos, word[pos - start]) for pos in free}
+                    if any(tiles and cross_word not in words for tiles, cross_word in crosses.values()):
+                        continue
+                    if not across and len(free) == 1 and crosses[free[0]][0]:
+                        continue
+                    for blanks in itertools.product((False, True), repeat=len(free)):
+                        used = [' ' if blank else word[pos - start] for pos, blank in zip(free, blanks)]
+                        if any(used.count(tile) > rack.count(tile) for tile in used):
+                            continue
+                        total, multiplier, cross_total = 0, 1, 0
+                        for pos in range(start, end + 1):
+                            if pos not in free:
+                                tile = squares[pos]
+                                total += 0 if tile.isupper() else LETTER_SCORES[tile]
+                                continue
+                            row, col = square(line, pos)
+                            value = 0 if blanks[free.index(pos)] else LETTER_SCORES[word[pos - start]]
+                            value *= LETTER_MULTIPLIERS.get(premiums[row][col], 1)
+                            total += value
+                            multiplier *= WORD_MULTIPLIERS.get(premiums[row][col], 1)
+                            tiles = crosses[pos][0]
+                            if tiles:
+                                cross_total += WORD_MULTIPLIERS.get(premiums[row][col], 1) * (value + sum(
+                                    0 if tile.isupper() else LETTER_SCORES[tile] for tile in tiles))
+                        score = total * multiplier + cross_total + (bingo if len(free) == rack_size else 0)
+                        tiles = tuple(square(line, pos) + (word[pos - start], blank)
+                                      for pos, blank in zip(free, blanks))
+                        moves.append(square(line, start) + (across, word, tiles, score))
+        return sorted(moves)
+
+    def test_random(self):
+        generator = random.Random(0)
+        for _ in range(20):
+            words = {''.join(generator.choices('abc', k=generator.randint(2, 5))) for _ in range(30)}
+            gaddag = GADDAG()
+            gaddag.build(words)
+            premiums = [''.join(generator.choices('..dtDT', k=5)) for _ in range(5)]
+            board = [[None] * 5 for _ in range(5)]
+            moves = MoveGenerator(gaddag, board, premiums=premiums, bingo=20, rack_size=4)
+            for _ in range(4):
+                rack = generator.choices('abc ', k=4)
+                found = moves.generate(rack)
+                self.assertEqual(sorted(map(tuple, found)),
+                                 self.brute_force(words, moves.board, rack, premiums, 4, 20))
+                if not found:
+                    break
+                # play drops the cross-checks the move changes, the others are kept
+                moves.play(generator.choice(found))
+
+
+class TestRack(unittest.TestCase):
+    """A rack codes its letters by its alphabet."""
+
+    def test_tiles(self):
+        alphabet = Alphabet(['a', 'c', 'ch', 'l', 'll'])
+        rack = Rack('chall ', alphabet)
+        self.assertEqual(list(rack), ['a', 'ch', 'll', ' '])
+        self.assertEqual(repr(rack), "Rack('achll ')")
+        self.assertIn('ch', rack)
+        self.assertNotIn('x', rack)
+        self.assertEqual(rack.take('ll', blank=False), 'll')
+        self.assertIsNone(rack.take('x', blank=False))
+        self.assertEqual(alphabet.encode_letters(rack.copy()), [1, 3, ' '])
+
+    def test_tile_not_in_alphabet(self):
+        with self.assertRaises(ValueError):
+            Rack(['ch'])
+
+
+if __name__ == '__main__':
+    unittest.main()